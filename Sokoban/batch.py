@@ -0,0 +1,131 @@
+"""
+Check a pack of levels (or many start states of them) for solvability
+on a pool of worker processes.
+
+    python batch.py maps/*.txt --workers 8 --timeout 30
+    python batch.py Microban.xsb --timeout 30
+    python batch.py --states states.jsonl
+
+Every finished job is printed as one json line right away, in the order
+the jobs finish. A line of --states looks like
+{"map": "maps/9.txt", "player": [1, 2], "crates": [[3, 2, 0], [5, 2, 1]]}
+where the third number of a crate is the pushes it already used.
+A collection file (.xsb/.sok, see collection.py) checks every level in
+it, a single one is named like "Microban.xsb#12".
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bounds
+import collection
+import config as c
+import controller
+import map_loader
+
+
+def thread_split(workers, cpus=None):
+    """clingo threads per worker so that all workers together fit the cores"""
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // workers)
+
+def solve_job(path, player_pos=None, crates=None, threads=1, timeout=None):
+    """Solve one start state of a level, crates maps tiles to pushes used"""
+    start = time.perf_counter()
+    level = map_loader.load_level_from_file(path)
+    if player_pos is None:
+        player_pos = level["player"]
+    if crates is None:
+        crates = {pos: 0 for pos in level["boxes"]}
+
+    stop = threading.Event()
+    timer = threading.Timer(timeout, stop.set) if timeout else None
+    if timer is not None:
+        timer.start()
+    try:
+        bound = bounds.lower_bound(level, player_pos, crates, c.PUSH_LIMIT)
+        if bound is None:
+            model = None
+        else:
+            facts = map_loader.build_asp_facts(level, player_pos, crates)
+            max_horizon = controller.horizon_limit(level, len(crates))
+            model = controller.solve_incremental(facts, max_horizon, threads, stop, bound[1])
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    if stop.is_set():
+        status = "timeout"
+    elif model is None:
+        status = "unsolvable"
+    else:
+        status = "solved"
+    return {
+        "map": path,
+        "player": list(player_pos),
+        "status": status,
+        "plan_length": len(controller.plan_steps(model)) if model is not None else None,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+def solve_many(jobs, workers=None, timeout=None):
+    """
+    Run (path, player_pos, crates) jobs on a process pool and yield their
+    results as they finish. player_pos and crates may be None for the
+    start of the level.
+    """
+    workers = workers or os.cpu_count() or 1
+    threads = thread_split(workers)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {
+            pool.submit(solve_job, path, player_pos, crates, threads, timeout): path
+            for path, player_pos, crates in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"map": futures[future], "status": f"error: {e}"}
+
+def read_states(path):
+    """Jobs from a json lines file, see the module docstring"""
+    jobs = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            state = json.loads(line)
+            player = tuple(state["player"]) if "player" in state else None
+            crates = None
+            if "crates" in state:
+                crates = {(x, y): used for x, y, used in state["crates"]}
+            jobs.append((state["map"], player, crates))
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("maps", nargs="*", help="level files solved from their start")
+    parser.add_argument("--states", help="json lines file of start states")
+    parser.add_argument("--workers", type=int, help="worker processes, default one per core")
+    parser.add_argument("--timeout", type=float, help="seconds per job")
+    args = parser.parse_args(argv)
+
+    jobs = [(name, None, None) for path in args.maps for name in collection.level_names(path)]
+    if args.states:
+        jobs.extend(read_states(args.states))
+    if not jobs:
+        parser.error("no maps or states given")
+
+    solved = 0
+    for result in solve_many(jobs, args.workers, args.timeout):
+        print(json.dumps(result), flush=True)
+        solved += result["status"] == "solved"
+    print(f"{solved}/{len(jobs)} solved", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
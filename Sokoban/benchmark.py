@@ -0,0 +1,469 @@
+"""
+Solve every map with every encoding and every hint backend and write a
+report that can be diffed between commits.
+
+    python benchmark.py --json bench.json --csv bench.csv
+    python benchmark.py --ground-baseline ground_baseline.json
+    python benchmark.py --ground-scaling 10 20 40 80 --csv scaling.csv
+    python benchmark.py --replay 10000 --csv replay.csv
+    python benchmark.py --tune --timeout 30
+
+Every job runs in its own process so the peak RSS belongs to that job
+alone. Times are in seconds: parse is loading the map and building the
+facts (plus loading the encoding for clingo), ground and solve come from
+controller.solve_horizon. For the native backend ground is building the
+distance tables of native_solver.Solver. first_model is the time from
+the start of solving to the first plan; clingo-plain runs clingo without
+--heuristic=Domain to compare it with the guided search. lower_bound is
+the horizon the search starts at (bounds.lower_bound), states it rules
+out are reported unsolvable without solving. The push encoding
+(sokoban_push.lp) reads the game facts, so it only runs on clingo and
+its plan length counts the steps after controller.push_steps.
+
+--ground-baseline only grounds the start of every map with every encoding
+for GROUND_HORIZON steps and compares the atoms and rules with the saved
+baseline, it exits with 1 when one of them grew. --update-baseline writes
+the current sizes to the baseline file instead. The baseline of the
+shipped maps is ground_baseline.json, tests/test_ground_size.py checks it.
+
+--ground-scaling grounds the start of every map with every encoding up
+to each of the given horizons and reports the grounding time, atoms and
+rules per horizon, to see how grounding grows with maxT.
+
+--replay N plays N random moves on every map through engine.Engine and
+takes back every move that loses the level, then replays the native plan
+of the map (searched for at most --timeout seconds) from clones of the
+start and reports the moves per second of both, the cost of simulating
+a session without pygame.
+
+--tune solves the start of every map with controller.Session in every
+clingo configuration of portfolio.py (or the --configuration ones) and
+saves the one with the shortest solve time as the profile of the map in
+config.PROFILE_DIR, which every later Session of the map uses. A map
+no configuration solves within --timeout keeps its old profile.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import clingo
+
+import bounds
+import config as c
+import controller
+import map_loader
+import native_solver
+import portfolio
+from board import BoardState
+from engine import Engine, MOVES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+import sokoban_text
+
+MAP_DIRS = [os.path.join(HERE, "maps"), os.path.join(ROOT, "maps")]
+ENCODINGS = {"game": controller.ENCODING, "push": controller.PUSH_ENCODING, "text": sokoban_text.BASE_LP_FILE}
+# clingo-plain is clingo without --heuristic=Domain, to see what the
+# #heuristic statements of the encodings are worth
+BACKENDS = ["clingo", "clingo-plain", "native"]
+
+# time steps grounded by the ground size check
+GROUND_HORIZON = 10
+GROUND_BASELINE = os.path.join(HERE, "ground_baseline.json")
+# maps too large to ground for the check (Indestructible_Word_Game has
+# over a hundred crates and runs out of memory)
+GROUND_SKIP = {"Indestructible_Word_Game.txt"}
+
+SCALING_FIELDS = ["map", "encoding", "horizon", "ground", "atoms", "rules"]
+
+REPLAY_FIELDS = ["map", "random_moves", "random_per_sec", "plan_length", "plan_replays", "plan_per_sec"]
+# seconds the solver plan is replayed for
+REPLAY_SECONDS = 1.0
+
+TUNE_FIELDS = ["map", "configuration", "status", "ground", "solve", "conflicts", "total"]
+
+FIELDS = [
+    "map", "encoding", "backend", "status", "plan_length",
+    "lower_bound", "parse", "ground", "solve", "first_model", "total",
+    "atoms", "rules", "choices", "conflicts", "expanded", "peak_rss_mb",
+]
+
+
+def map_files(dirs=MAP_DIRS):
+    files = []
+    for d in dirs:
+        files.extend(sorted(glob.glob(os.path.join(d, "*.txt"))))
+    return files
+
+def map_name(path):
+    return os.path.relpath(path, ROOT)
+
+def load(path, encoding):
+    """Level dict and the facts of its start state for that encoding"""
+    if encoding in ("game", "push"):
+        level = map_loader.load_level_from_file(path)
+        return level, map_loader.build_asp_facts(level, level["player"], {b: 0 for b in level["boxes"]})
+    level = sokoban_text.load_level_from_file(path)
+    boxes = {f"b{n}": pos for n, pos in enumerate(level["boxes"], start = 1)}
+    pushes_left = {bid: sokoban_text.MAX_PUSHES_PER_BOX for bid in boxes}
+    return level, sokoban_text.build_asp_facts(level, level["player"], boxes, pushes_left)
+
+def run_clingo(path, encoding, stop, row, heuristic=True):
+    start = time.perf_counter()
+    level, facts = load(path, encoding)
+    args = ["--stats", "--opt-mode=opt", f"-t{c.SOLVER_THREADS}"]
+    if encoding != "text":
+        args += controller.PUSH_ARGS
+    if heuristic:
+        args.append("--heuristic=Domain")
+    # the info messages about unused atoms would drown the report
+    ctl = clingo.Control(args, logger=lambda code, message: None)
+    ctl.load(ENCODINGS[encoding])
+    ctl.add("base", [], facts)
+    row["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+    times = {"ground": time.perf_counter() - start}
+
+    model = []
+    solve_start = time.perf_counter()
+
+    def on_model(m):
+        if not model:
+            row["first_model"] = time.perf_counter() - solve_start
+        model[:] = m.symbols(shown=True)
+
+    limit = sokoban_text.MAX_PUSHES_PER_BOX if encoding == "text" else c.PUSH_LIMIT
+    bound = bounds.lower_bound(level, level["player"], {pos: 0 for pos in level["boxes"]}, limit)
+    if bound is None:
+        return
+    if encoding == "push":
+        # every step is a push, sokoban_push.lp allows maxPush of them per crate
+        max_horizon = ctl.get_const("maxPush").number * len(level["boxes"])
+        row["lower_bound"] = bound[0]
+    else:
+        max_horizon = controller.horizon_limit(level, len(level["boxes"]))
+        row["lower_bound"] = bound[1]
+    horizon, _ = controller.solve_horizon(ctl, 0, max_horizon, on_model, stop, times, row["lower_bound"])
+    row["ground"] = times["ground"]
+    row["solve"] = times.get("solve")
+
+    stats = ctl.statistics
+    row["atoms"] = int(stats["problem"]["lp"]["atoms"])
+    row["rules"] = int(stats["problem"]["lp"]["rules"])
+    row["choices"] = int(stats["accu"]["solving"]["solvers"]["choices"])
+    row["conflicts"] = int(stats["accu"]["solving"]["solvers"]["conflicts"])
+    if horizon is not None:
+        row["status"] = "solved"
+        if encoding == "push":
+            state = BoardState.from_level(level)
+            row["plan_length"] = len(controller.push_steps(state, list(level["boxes"]), model))
+        else:
+            row["plan_length"] = sum(1 for s in model if s.match("do", 2) or s.match("move", 2))
+
+def ground_size(path, encoding, horizon=GROUND_HORIZON, times=None):
+    """
+    Atoms and rules of the start state grounded for horizon steps, the
+    grounding seconds are stored in times["ground"] when a dict is given.
+    """
+    level, facts = load(path, encoding)
+    args = ["--stats"] + (controller.PUSH_ARGS if encoding != "text" else [])
+    ctl = clingo.Control(args, logger=lambda code, message: None)
+    ctl.load(ENCODINGS[encoding])
+    ctl.add("base", [], facts)
+    start = time.perf_counter()
+    ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+    controller.ground_horizon(ctl, 1, horizon)
+    if times is not None:
+        times["ground"] = time.perf_counter() - start
+    # the problem statistics are only filled in by a solve call
+    ctl.solve()
+    lp = ctl.statistics["problem"]["lp"]
+    return {"atoms": int(lp["atoms"]), "rules": int(lp["rules"])}
+
+def ground_scaling(paths, encodings, horizons):
+    """Grounding time and size of every map and encoding per horizon"""
+    rows = []
+    for path in paths:
+        for encoding in encodings:
+            for horizon in horizons:
+                times = {}
+                row = {"map": map_name(path), "encoding": encoding, "horizon": horizon}
+                row.update(ground_size(path, encoding, horizon, times))
+                row["ground"] = round(times["ground"], 3)
+                print(
+                    f"{row['map']:40} {encoding:5} T={horizon:<4} {row['ground']:8.3f}s "
+                    f"atoms {row['atoms']:8} rules {row['rules']:8}",
+                    flush=True,
+                )
+                rows.append(row)
+    return rows
+
+def check_ground(paths, encodings, baseline_path, update=False):
+    """Compare the ground sizes with the baseline file, False if one grew"""
+    sizes = {}
+    for path in paths:
+        if os.path.basename(path) in GROUND_SKIP:
+            continue
+        for encoding in encodings:
+            sizes[f"{map_name(path)} {encoding}"] = ground_size(path, encoding)
+
+    if update or not os.path.exists(baseline_path):
+        write_json(sizes, baseline_path)
+        print(f"wrote {baseline_path}")
+        return True
+
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    ok = True
+    for name, size in sizes.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:45} new      atoms {size['atoms']:8} rules {size['rules']:8}")
+            continue
+        grew = size["atoms"] > old["atoms"] or size["rules"] > old["rules"]
+        ok = ok and not grew
+        print(
+            f"{name:45} {'GREW' if grew else 'ok':8} "
+            f"atoms {old['atoms']:8} -> {size['atoms']:8} "
+            f"rules {old['rules']:8} -> {size['rules']:8}"
+        )
+    return ok
+
+def replay(paths, moves, timeout, seed=0):
+    """
+    Moves per second of engine.Engine for random moves and the native plan
+    of every map, the plan search gives up after timeout seconds.
+    """
+    rng = random.Random(seed)
+    names = list(MOVES)
+    rows = []
+    for path in paths:
+        level = map_loader.load_level_from_file(path)
+        engine = Engine(level, c.MAX_PUSHES, destroy=True)
+        row = {"map": map_name(path), "random_moves": moves}
+
+        start = time.perf_counter()
+        for _ in range(moves):
+            landed = engine.apply(rng.choice(names))
+            if landed is not None and engine.lost:
+                engine.undo()
+        row["random_per_sec"] = round(moves / (time.perf_counter() - start))
+
+        engine.reset()
+        stop = threading.Event()
+        timer = threading.Timer(timeout, stop.set)
+        timer.start()
+        try:
+            plan = native_solver.crate_plan(level, level["player"], engine.crates(), stop)
+        except native_solver.GaveUp:
+            plan = None
+        timer.cancel()
+        if plan:
+            replays = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < REPLAY_SECONDS:
+                game = engine.clone()
+                assert game.apply_moves(plan) == len(plan) and game.completed()
+                replays += 1
+            row["plan_length"] = len(plan)
+            row["plan_replays"] = replays
+            row["plan_per_sec"] = round(replays * len(plan) / (time.perf_counter() - start))
+        print(
+            f"{row['map']:40} random {row['random_per_sec']:9}/s "
+            f"plan {row.get('plan_per_sec') or '-':>9}/s",
+            flush=True,
+        )
+        rows.append(row)
+    return rows
+
+def tune_job(path, configuration, timeout):
+    """One --tune row: the start of the map solved by a Session in that configuration"""
+    # every configuration grounds the level itself
+    c.GROUND_CACHE_DIR = None
+    level = map_loader.load_level_from_file(path)
+    row = {"map": map_name(path), "configuration": configuration, "status": "unsolvable"}
+    metrics = {}
+    stop = threading.Event()
+    timer = threading.Timer(timeout, stop.set)
+    timer.start()
+    start = time.perf_counter()
+    try:
+        session = controller.Session(level, configuration)
+        results = session.solve(level["player"], {pos: 0 for pos in level["boxes"]}, stop, metrics)
+        if results is not None:
+            row["status"] = "solved"
+    finally:
+        timer.cancel()
+    row["total"] = round(time.perf_counter() - start, 3)
+    if stop.is_set():
+        row["status"] = "timeout"
+    elif metrics.get("outcome", "").startswith("error"):
+        row["status"] = metrics["outcome"]
+    row["conflicts"] = metrics.get("conflicts")
+    for field in ("ground", "solve"):
+        row[field] = round(metrics[field], 3) if field in metrics else None
+    return row, level["name"]
+
+def tune(paths, configurations, timeout):
+    """Solve every map in every configuration and save the fastest one as its profile"""
+    rows = []
+    for path in paths:
+        times = {}
+        for configuration in configurations:
+            with ProcessPoolExecutor(1) as pool:
+                row, name = pool.submit(tune_job, path, configuration, timeout).result()
+            print(f"{row['map']:40} {configuration:8} {row['status']:10} {row['total']:8.3f}s", flush=True)
+            rows.append(row)
+            times[configuration] = row["solve"] if row["status"] == "solved" else None
+        solved = {configuration: solve for configuration, solve in times.items() if solve is not None}
+        if solved:
+            best = min(solved, key=solved.get)
+            saved = portfolio.save_profile(name, best, times)
+            print(f"{map_name(path):40} -> {best}{'' if saved else ' (not saved, PROFILE_DIR is None)'}", flush=True)
+    return rows
+
+def run_native(path, encoding, stop, row):
+    start = time.perf_counter()
+    if encoding in ("game", "push"):
+        level = map_loader.load_level_from_file(path)
+        limit = c.PUSH_LIMIT
+    else:
+        level = sokoban_text.load_level_from_file(path)
+        limit = sokoban_text.MAX_PUSHES_PER_BOX
+    row["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solver = native_solver.Solver(level, limit)
+    state = solver.state(level["player"], {pos: limit for pos in level["boxes"]})
+    row["ground"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        steps = solver.solve(state, stop)
+        if steps is not None:
+            row["status"] = "solved"
+            row["plan_length"] = len(steps)
+    except (native_solver.Cancelled, native_solver.GaveUp):
+        row["status"] = "gave up"
+    row["solve"] = time.perf_counter() - start
+    row["expanded"] = solver.expanded
+
+def run_job(path, encoding, backend, timeout):
+    """One report row, the job is stopped after timeout seconds"""
+    row = {field: None for field in FIELDS}
+    row.update(map=map_name(path), encoding=encoding, backend=backend, status="unsolvable")
+    stop = threading.Event()
+    timer = threading.Timer(timeout, stop.set)
+    timer.start()
+    start = time.perf_counter()
+    try:
+        if backend == "clingo":
+            run_clingo(path, encoding, stop, row)
+        elif backend == "clingo-plain":
+            run_clingo(path, encoding, stop, row, heuristic=False)
+        else:
+            run_native(path, encoding, stop, row)
+    except Exception as e:
+        row["status"] = f"error: {e}"
+    finally:
+        timer.cancel()
+    row["total"] = time.perf_counter() - start
+    if stop.is_set():
+        row["status"] = "timeout"
+    # ru_maxrss is in KiB on Linux
+    row["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for field in ("parse", "ground", "solve", "first_model", "total", "peak_rss_mb"):
+        if row[field] is not None:
+            row[field] = round(row[field], 3)
+    return row
+
+def run_isolated(path, encoding, backend, timeout):
+    with ProcessPoolExecutor(1) as pool:
+        return pool.submit(run_job, path, encoding, backend, timeout).result()
+
+def write_json(rows, path):
+    with open(path, "w") as f:
+        json.dump(rows, f, indent=1)
+        f.write("\n")
+
+def write_csv(rows, path, fields=FIELDS):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("maps", nargs="*", help="map files, default every map in maps/ and ../maps/")
+    parser.add_argument("--encoding", choices=sorted(ENCODINGS), action="append")
+    parser.add_argument("--backend", choices=BACKENDS, action="append")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per job")
+    parser.add_argument("--json", help="write the report as json")
+    parser.add_argument("--csv", help="write the report as csv")
+    parser.add_argument("--ground-baseline", help="check the ground sizes against this json file")
+    parser.add_argument("--update-baseline", action="store_true", help="rewrite the ground size baseline")
+    parser.add_argument("--ground-scaling", type=int, nargs="+", metavar="T", help="only ground up to these horizons")
+    parser.add_argument("--replay", type=int, metavar="N", help="only replay N random moves and the native plan per map")
+    parser.add_argument("--tune", action="store_true", help="only save the fastest clingo configuration per map")
+    parser.add_argument("--configuration", choices=sorted(portfolio.CONFIGURATIONS), action="append")
+    args = parser.parse_args(argv)
+
+    if args.ground_baseline:
+        ok = check_ground(args.maps or map_files(), args.encoding or sorted(ENCODINGS), args.ground_baseline, args.update_baseline)
+        sys.exit(0 if ok else 1)
+
+    if args.ground_scaling:
+        rows = ground_scaling(args.maps or map_files(), args.encoding or sorted(ENCODINGS), args.ground_scaling)
+        if args.json:
+            write_json(rows, args.json)
+        if args.csv:
+            write_csv(rows, args.csv, SCALING_FIELDS)
+        return rows
+
+    if args.replay:
+        rows = replay(args.maps or map_files(), args.replay, args.timeout)
+        if args.json:
+            write_json(rows, args.json)
+        if args.csv:
+            write_csv(rows, args.csv, REPLAY_FIELDS)
+        return rows
+
+    if args.tune:
+        rows = tune(args.maps or map_files(), args.configuration or list(portfolio.CONFIGURATIONS), args.timeout)
+        if args.json:
+            write_json(rows, args.json)
+        if args.csv:
+            write_csv(rows, args.csv, TUNE_FIELDS)
+        return rows
+
+    rows = []
+    for path in args.maps or map_files():
+        for encoding in args.encoding or sorted(ENCODINGS):
+            for backend in args.backend or BACKENDS:
+                if encoding == "push" and backend == "native":
+                    continue
+                row = run_isolated(path, encoding, backend, args.timeout)
+                print(f"{row['map']:40} {encoding:5} {backend:12} {row['status']:10} {row['total']:8.3f}s", flush=True)
+                rows.append(row)
+
+    if args.json:
+        write_json(rows, args.json)
+    if args.csv:
+        write_csv(rows, args.csv)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
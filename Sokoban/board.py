@@ -0,0 +1,173 @@
+from collections import deque
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+
+class BoardState:
+    """
+    Game state packed into integers. A tile (x, y) is bit x + y * stride of
+    the walls/goals/boxes masks, the grid has one spare row and column around
+    the level so the outside counts as solid for 0 and 1 based levels.
+    The pushes made with every box are kept in a bytearray at the box tile
+    and move along with it.
+    """
+    __slots__ = ("stride", "solid", "goals", "boxes", "pushes", "player")
+
+    def __init__(self, stride, solid, goals, boxes, pushes, player):
+        self.stride = stride
+        self.solid = solid
+        self.goals = goals
+        self.boxes = boxes
+        self.pushes = pushes
+        self.player = player
+
+    @classmethod
+    def from_level(cls, level, boxes=None, player=None, origin=0):
+        """
+        boxes is an iterable of box tiles or a dict of box tile to pushes
+        used, both default to the start of the level.
+        """
+        stride = level["width"] + 2
+        size = stride * (level["height"] + 2)
+        solid = (1 << size) - 1
+        for y in range(origin, origin + level["height"]):
+            for x in range(origin, origin + level["width"]):
+                solid &= ~(1 << (x + y * stride))
+        for x, y in level["walls"]:
+            solid |= 1 << (x + y * stride)
+
+        goals = 0
+        for x, y in level["goals"]:
+            goals |= 1 << (x + y * stride)
+
+        if boxes is None:
+            boxes = level["boxes"]
+        if not isinstance(boxes, dict):
+            boxes = {pos: 0 for pos in boxes}
+        box_mask = 0
+        pushes = bytearray(size)
+        for (x, y), used in boxes.items():
+            box_mask |= 1 << (x + y * stride)
+            pushes[x + y * stride] = used
+
+        px, py = player if player is not None else level["player"]
+        return cls(stride, solid, goals, box_mask, pushes, px + py * stride)
+
+    def index(self, pos):
+        return pos[0] + pos[1] * self.stride
+
+    def pos(self, i):
+        return i % self.stride, i // self.stride
+
+    def offset(self, dx, dy):
+        return dx + dy * self.stride
+
+    def direction(self, d):
+        """(dx, dy) of a tile offset"""
+        for dx, dy in DIRECTIONS:
+            if self.offset(dx, dy) == d:
+                return dx, dy
+
+    def is_solid(self, i):
+        return i < 0 or self.solid >> i & 1
+
+    def has_box(self, i):
+        return self.boxes >> i & 1
+
+    def is_goal(self, i):
+        return self.goals >> i & 1
+
+    def blocked(self, i):
+        return i < 0 or (self.solid | self.boxes) >> i & 1
+
+    def can_move(self, dx, dy, max_pushes=None):
+        """Whether the player can walk or push one step in this direction"""
+        d = self.offset(dx, dy)
+        target = self.player + d
+        if self.is_solid(target):
+            return False
+        if not self.has_box(target):
+            return True
+        if max_pushes is not None and self.pushes[target] >= max_pushes:
+            return False
+        return not self.blocked(target + d)
+
+    def move(self, dx, dy, max_pushes=None):
+        """
+        Walk or push one step. Returns None if the move is not allowed,
+        -1 if the player only walked, else the tile the pushed box landed on.
+        """
+        if not self.can_move(dx, dy, max_pushes):
+            return None
+        d = self.offset(dx, dy)
+        target = self.player + d
+        if not self.has_box(target):
+            self.player = target
+            return -1
+        return self.push(target, d)
+
+    def push(self, box, d):
+        """Push the box on tile `box` by offset d without any checks"""
+        beyond = box + d
+        self.player = box
+        self.boxes ^= (1 << box) | (1 << beyond)
+        self.pushes[beyond] = self.pushes[box] + 1
+        self.pushes[box] = 0
+        return beyond
+
+    def walk(self):
+        """Tiles the player reaches without pushing, each with the tile it came from"""
+        offsets = (-self.stride, self.stride, -1, 1)
+        parent = {self.player: None}
+        todo = deque([self.player])
+        while todo:
+            i = todo.popleft()
+            for d in offsets:
+                nxt = i + d
+                if nxt not in parent and not self.blocked(nxt):
+                    parent[nxt] = i
+                    todo.append(nxt)
+        return parent
+
+    def legal_moves(self, max_pushes=None):
+        return [(dx, dy) for dx, dy in DIRECTIONS if self.can_move(dx, dy, max_pushes)]
+
+    def remove_box(self, i):
+        self.boxes &= ~(1 << i)
+        self.pushes[i] = 0
+
+    def box_cells(self):
+        """Tile indices of all boxes, lowest first"""
+        cells = []
+        boxes = self.boxes
+        while boxes:
+            low = boxes & -boxes
+            cells.append(low.bit_length() - 1)
+            boxes ^= low
+        return cells
+
+    def box_count(self):
+        return bin(self.boxes).count("1")
+
+    def box_rank(self, i):
+        """Position of the box on tile i in box_cells()"""
+        return bin(self.boxes & ((1 << i) - 1)).count("1")
+
+    def crates(self):
+        """Box tiles with their pushes used, like the crates dict in game.py"""
+        return {self.pos(i): self.pushes[i] for i in self.box_cells()}
+
+    def completed(self):
+        return self.boxes == self.goals
+
+    def copy(self):
+        return BoardState(self.stride, self.solid, self.goals, self.boxes, bytearray(self.pushes), self.player)
+
+    def key(self):
+        return self.player, self.boxes, bytes(self.pushes)
+
+    def __eq__(self, other):
+        return isinstance(other, BoardState) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
@@ -0,0 +1,107 @@
+from collections import deque
+
+import deadlock
+
+# cost of a box to goal pair that does not fit the push budget
+INFEASIBLE = 10 ** 9
+
+
+def min_cost_matching(cost):
+    """
+    Hungarian algorithm for a square cost matrix, returns the cheapest
+    total of one column per row.
+    """
+    n = len(cost)
+    u = [0] * (n + 1)
+    v = [0] * (n + 1)
+    match = [0] * (n + 1)
+    way = [0] * (n + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        minv = [float("inf")] * (n + 1)
+        used = [False] * (n + 1)
+        while True:
+            used[col] = True
+            r = match[col]
+            delta = float("inf")
+            nxt = 0
+            for j in range(1, n + 1):
+                if used[j]:
+                    continue
+                cur = cost[r - 1][j - 1] - u[r] - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = col
+                if minv[j] < delta:
+                    delta = minv[j]
+                    nxt = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            col = nxt
+            if match[col] == 0:
+                break
+        while col:
+            prev = way[col]
+            match[col] = match[prev]
+            col = prev
+    return sum(cost[match[j] - 1][j - 1] for j in range(1, n + 1))
+
+def walk_distance(level, player_pos, boxes, floor):
+    """
+    Steps the player walks at least before the first push: to a tile next
+    to any box, 0 when every box is on a goal already. Boxes do not block
+    the walk, the player may push them aside or go around, so a box it
+    can not reach yet does not make the bound fail.
+    """
+    if all(pos in level["goals"] for pos in boxes):
+        return 0
+    targets = set()
+    for x, y in boxes:
+        targets.update((x - dx, y - dy) for dx, dy in deadlock.DIRECTIONS)
+    dist = {player_pos: 0}
+    todo = deque([player_pos])
+    while todo:
+        pos = todo.popleft()
+        if pos in targets:
+            return dist[pos]
+        x, y = pos
+        for dx, dy in deadlock.DIRECTIONS:
+            nxt = (x + dx, y + dy)
+            if nxt not in dist and nxt in floor:
+                dist[nxt] = dist[pos] + 1
+                todo.append(nxt)
+    return 0
+
+def lower_bound(level, player_pos, boxes, limit):
+    """
+    Admissible bounds for a state: (pushes, steps) no plan can beat, or
+    None when the state can not be solved. boxes maps every box tile to
+    its pushes used and limit is the pushes a box may make in total.
+    Pushes is the cheapest box to goal matching by push distance where
+    no box goes beyond its budget, steps adds the walk to the first push.
+    """
+    floor = deadlock.floor_cells(level)
+    goals = sorted(g for g in level["goals"] if g in floor)
+    if len(boxes) != len(level["goals"]) or len(boxes) > len(goals):
+        return None
+
+    goal_dists = deadlock.goal_distances(level, floor)
+    cost = []
+    for pos, used in boxes.items():
+        row = []
+        for goal in goals:
+            d = goal_dists[goal].get(pos)
+            row.append(INFEASIBLE if d is None or d > limit - used else d)
+        if min(row) == INFEASIBLE:
+            return None
+        cost.append(row)
+
+    pushes = min_cost_matching(cost) if cost else 0
+    if pushes >= INFEASIBLE:
+        return None
+    return pushes, pushes + walk_distance(level, player_pos, boxes, floor)
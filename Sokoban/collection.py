@@ -0,0 +1,203 @@
+"""
+Level collections: one .xsb/.sok file holding many levels, separated by
+anything that is not a board line (empty lines, comments, metadata).
+A level of a collection is named "file.xsb#12" (the 12th level) or
+"file.xsb#Title" and both map_loader.load_level_from_file and
+sokoban_text.load_level_from_file accept such a name as path.
+
+The file is memory-mapped and scanned once for the byte offsets of every
+board and its Title: line. The index is saved next to the file as
+file.xsb.index.json and used as long as the file keeps its size and
+modification time, so opening even a huge collection only reads that
+index and a level is only parsed when it is asked for.
+"""
+import bisect
+import json
+import mmap
+import os
+from functools import lru_cache
+
+COLLECTION_EXTENSIONS = (".xsb", ".sok")
+BOARD_CHARS = b" #@+$*.-_"
+# bump when the index format changes
+INDEX_VERSION = 1
+
+
+def is_collection(path):
+    return path.lower().endswith(COLLECTION_EXTENSIONS)
+
+def is_board(line):
+    """Board lines only use level symbols and have at least one wall"""
+    return b"#" in line and not line.translate(None, BOARD_CHARS)
+
+def title_of(line):
+    """The title of a "Title: ..." line, None for any other line"""
+    line = line.strip()
+    if line[:6].lower() != b"title:":
+        return None
+    return line[6:].decode("utf-8", "replace").strip()
+
+def scan(data):
+    """
+    [start, end, title] of every board in the bytes. A Title: line
+    belongs to the board before it when that one has none yet, else
+    to the next board, so titles above and below boards both work.
+    """
+    levels = []
+    start = end = None
+    pending = None
+    pos = 0
+    size = len(data)
+    while pos < size:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            nl = size
+        line = data[pos:nl].rstrip(b"\r")
+        if is_board(line):
+            if start is None:
+                start = pos
+            end = nl
+        else:
+            if start is not None:
+                levels.append([start, end, pending])
+                start = pending = None
+            title = title_of(line)
+            if title is not None:
+                if levels and levels[-1][2] is None and pending is None:
+                    levels[-1][2] = title
+                else:
+                    pending = title
+        pos = nl + 1
+    if start is not None:
+        levels.append([start, end, pending])
+    return levels
+
+
+class Collection:
+    """The levels of one collection file, read lazily through the index"""
+    def __init__(self, path):
+        self.path = path
+        self.base = os.path.basename(path)
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        self.stamp = [INDEX_VERSION, stat.st_size, stat.st_mtime_ns]
+        self.index_path = path + ".index.json"
+        self.index = self.load_index()
+        if self.index is None:
+            self.index = scan(self.data)
+            self.save_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get("stamp") != self.stamp:
+            return None
+        return saved["levels"]
+
+    def save_index(self):
+        """A collection in a read-only place is scanned every time instead"""
+        try:
+            with open(self.index_path, "w") as f:
+                json.dump({"stamp": self.stamp, "levels": self.index}, f)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        """(name, board lines) of every level in order, one at a time"""
+        for i in range(len(self)):
+            yield self.name(i), self.lines(i)
+
+    def lines(self, i):
+        start, end, _ = self.index[i]
+        return self.data[start:end].decode("utf-8", "replace").splitlines()
+
+    def title(self, i):
+        return self.index[i][2]
+
+    def name(self, i):
+        return f"{self.base}#{i + 1}"
+
+    def find(self, which):
+        """Index of the level with this number (from 1) or title"""
+        if which.isdigit():
+            i = int(which) - 1
+            if 0 <= i < len(self):
+                return i
+        else:
+            for i, (_, _, title) in enumerate(self.index):
+                if title == which:
+                    return i
+        raise KeyError(f"no level {which!r} in {self.path}")
+
+
+@lru_cache(maxsize=8)
+def open_collection(path):
+    return Collection(path)
+
+def split_name(path):
+    """("file.xsb", "12") for "file.xsb#12", (path, None) for anything else"""
+    head, sep, which = path.rpartition("#")
+    if sep and is_collection(head):
+        return head, which
+    return path, None
+
+def read_level(path):
+    """
+    (lines, name) of a level file, or of one level of a collection when
+    path is "file.xsb#12" or "file.xsb#Title" (the first level without #).
+    """
+    path, which = split_name(path)
+    if not is_collection(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f], os.path.basename(path)
+    levels = open_collection(os.path.abspath(path))
+    i = levels.find(which) if which else 0
+    return levels.lines(i), levels.name(i)
+
+def level_names(path):
+    """path itself for a level file, "path#n" for every level of a collection"""
+    if not is_collection(path):
+        yield path
+        return
+    for i in range(len(open_collection(os.path.abspath(path)))):
+        yield f"{path}#{i + 1}"
+
+
+class Levels:
+    """
+    Sequence of the levels of many level files and collections, a level
+    is only loaded with load(name) when it is indexed.
+    """
+    def __init__(self, paths, load):
+        self.load = load
+        self.paths = []
+        self.starts = []
+        self.total = 0
+        for path in paths:
+            count = len(open_collection(os.path.abspath(path))) if is_collection(path) else None
+            self.paths.append((path, count))
+            self.starts.append(self.total)
+            self.total += 1 if count is None else count
+
+    def __len__(self):
+        return self.total
+
+    def name(self, i):
+        """The path load() gets for level i"""
+        k = bisect.bisect_right(self.starts, i) - 1
+        path, count = self.paths[k]
+        return path if count is None else f"{path}#{i - self.starts[k] + 1}"
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.total
+        if not 0 <= i < self.total:
+            raise IndexError(i)
+        return self.load(self.name(i))
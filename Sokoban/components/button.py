@@ -9,15 +9,15 @@ class Button:
         self.hover = False
         self.screen = screen
         self.font = pygame.font.SysFont(None, 24)
+        self.label = self.font.render(self.text, True, c.TEXT_COLOR)
 
 
     def draw(self):
         color = c.BUTTON_HOVER if self.hover else c.BUTTON_COLOR
         pygame.draw.rect(self.screen, color, self.rect, border_radius=6)
 
-        label = self.font.render(self.text, True, c.TEXT_COLOR)
-        label_rect = label.get_rect(center=self.rect.center)
-        self.screen.blit(label, label_rect)
+        label_rect = self.label.get_rect(center=self.rect.center)
+        self.screen.blit(self.label, label_rect)
 
     def update(self, mouse_pos):
         self.hover = self.rect.collidepoint(mouse_pos)
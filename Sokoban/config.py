@@ -1,7 +1,14 @@
+import os
+
 TILE_SIZE = 48
 GRID_WIDTH = 15
 GRID_HEIGHT = 15
 TOP_BAR_HEIGHT = 48
+# a line under the buttons with the newest solver call (telemetry.py)
+TELEMETRY_OVERLAY = False
+TELEMETRY_LINE_HEIGHT = 20
+# where the board starts
+BOARD_TOP = TOP_BAR_HEIGHT + (TELEMETRY_LINE_HEIGHT if TELEMETRY_OVERLAY else 0)
 BUTTON_WIDTH = 100
 BUTTON_HEIGHT = 32
 BUTTON_PADDING = 10
@@ -9,7 +16,7 @@ BUTTON_PADDING = 10
 SCREEN_WIDTH = GRID_WIDTH * TILE_SIZE
 SCREEN_HEIGHT = GRID_HEIGHT * TILE_SIZE
 SCREEN_WIDTH = GRID_WIDTH * TILE_SIZE
-SCREEN_HEIGHT = GRID_HEIGHT * TILE_SIZE + TOP_BAR_HEIGHT
+SCREEN_HEIGHT = GRID_HEIGHT * TILE_SIZE + BOARD_TOP
 
 TOP_BAR_COLOR = (45, 45, 45)
 BUTTON_COLOR = (80, 80, 80)
@@ -23,4 +30,40 @@ WALL_COLOR = (128, 128, 128)
 GOAL_COLOR = (240, 200, 40)
 GOAL_RADIUS = TILE_SIZE // 6
 MAX_PUSHES = 5
-
+# pushes a crate may make, game.py destroys a crate on its MAX_PUSHES-th push
+# (maxPush of sokoban.lp and sokoban_push.lp)
+PUSH_LIMIT = MAX_PUSHES - 1
+# hint solver: "clingo", "push" (sokoban_push.lp), "native" (native_solver.py)
+# "race" for clingo and native at once or "portfolio" for clingo with every
+# configuration of PORTFOLIO at once (see portfolio.py)
+HINT_BACKEND = "clingo"
+# states kept by the hint cache, HINT_CACHE_DIR saves them per map (None = memory only)
+HINT_CACHE_SIZE = 4096
+HINT_CACHE_DIR = None
+# clingo threads per solve, one core is left for drawing the game
+SOLVER_THREADS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# clingo configurations the portfolio backend races, one thread each
+PORTFOLIO = ["default", "frumpy", "jumpy", "usc"]
+# directory of the per map clingo configurations chosen by benchmark.py
+# --tune, see portfolio.py (None = no profiles are read or saved)
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+# let the #heuristic statements of the encodings guide clingo, off since
+# benchmark.py measures more conflicts with them than without (clingo-plain)
+DOMAIN_HEURISTIC = False
+# seconds an anytime hint may take (None = wait for the shortest plan)
+# and the longest horizon it optimizes over, without a plan in that time
+# the hint waits for the shortest plan anyway
+HINT_BUDGET = None
+ANYTIME_HORIZON = 40
+# directory for the ground programs of controller.Session (None = ground every
+# session), they are grounded up to GROUND_CACHE_HORIZON steps at once
+GROUND_CACHE_DIR = None
+GROUND_CACHE_HORIZON = 40
+# unix socket or "127.0.0.1:port" of hint_server.py that game.py asks for
+# hints and checks (None = solve in the game), the anytime hint is not used then
+HINT_SERVER = None
+# json lines file with one record per solver call (None = no log), see
+# telemetry.py, rotated at TELEMETRY_LOG_BYTES keeping TELEMETRY_LOG_BACKUPS files
+TELEMETRY_LOG = None
+TELEMETRY_LOG_BYTES = 10 * 1024 * 1024
+TELEMETRY_LOG_BACKUPS = 5
@@ -1,29 +1,238 @@
 import clingo
-import re
+import hashlib
+import os
+import threading
+import time
+
+import bounds
+import config as c
+import ground_cache
+import hint_client
+import map_loader
+import native_solver
+import portfolio
+import telemetry
+from board import BoardState
+from hint_cache import HintCache, first_step
+
+ENCODING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sokoban.lp")
+# one time step per crate push, see push_plan
+PUSH_ENCODING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sokoban_push.lp")
+
+# clingo options for the #heuristic statements, see config.DOMAIN_HEURISTIC
+HEURISTIC_ARGS = ["--heuristic=Domain"] if c.DOMAIN_HEURISTIC else []
+# maxPush of the encodings
+PUSH_ARGS = ["-c", f"maxPush={c.PUSH_LIMIT}"]
 
 final_model = None
 
+# plans of every session, see hint_cache.py
+hint_cache = HintCache(c.HINT_CACHE_SIZE)
+
 
 def on_model(model):
     global final_model
     final_model = model.symbols(shown=True)
 
-def solve(map_facts):
-    ctl = clingo.control.Control(["--stats", "--opt-mode=opt", "-t4"])
+def query(t, literals=None):
+    """The query(t) external, its program literal for a control loaded from ground_cache"""
+    sym = clingo.Function("query", [clingo.Number(t)])
+    return sym if literals is None else literals[str(sym)]
+
+def ground_horizon(ctl, start, stop):
+    """Ground the step and check parts for the time steps start..stop"""
+    parts = []
+    for t in range(start, stop + 1):
+        parts.append(("step", [clingo.Number(t)]))
+        parts.append(("check", [clingo.Number(t)]))
+    ctl.ground(parts)
+
+def horizon_limit(level, crate_count):
+    """
+    Longest plan worth searching for: every crate can be pushed at most
+    MAX_PUSHES times and between two pushes the player never needs more
+    steps than there are floor tiles.
+    """
+    floor = level["width"] * level["height"] - len(level["walls"])
+    return (c.MAX_PUSHES * crate_count + 1) * floor
+
+def solve_horizon(ctl, grounded, max_horizon, on_model, stop=None, metrics=None, start=0, literals=None):
+    """
+    Grow the horizon one time step at a time from `start` (a lower bound
+    from bounds.lower_bound) and stop at the first one where every crate
+    can stand on a goal. Steps up to `grounded` are reused instead of
+    grounded again, setting the `stop` event cancels the search. The
+    seconds spent grounding and solving are added to metrics["ground"] and
+    metrics["solve"] when a dict is given, with the statistics of every
+    solve call (telemetry.count). literals maps the externals to program
+    literals (see ground_cache.py).
+    Returns the horizon (None if there is no plan up to max_horizon)
+    and the last grounded step.
+    """
+    times = {} if metrics is None else metrics
+    t = start
+    while max_horizon is None or t <= max_horizon:
+        began = time.perf_counter()
+        if t > grounded:
+            ground_horizon(ctl, grounded + 1, t)
+            grounded = t
+        grounded_at = time.perf_counter()
+        ctl.assign_external(query(t, literals), True)
+        with ctl.solve(on_model=on_model, async_=True) as handle:
+            while not handle.wait(0.05):
+                if stop is not None and stop.is_set():
+                    handle.cancel()
+            result = handle.get()
+        # the statistics are only those of this call until the program changes
+        telemetry.count(metrics, ctl)
+        ctl.assign_external(query(t, literals), False)
+        times["ground"] = times.get("ground", 0) + grounded_at - began
+        times["solve"] = times.get("solve", 0) + time.perf_counter() - grounded_at
+        if stop is not None and stop.is_set():
+            return None, grounded
+        if result.satisfiable:
+            return t, grounded
+        t += 1
+    return None, grounded
+
+def solve_anytime(ctl, grounded, horizon, budget, stop=None, literals=None, metrics=None):
+    """
+    Solve at the fixed horizon for at most `budget` seconds. The first
+    plan comes back as soon as it is found and every later model is a
+    better one for the #minimize statement. Returns the symbols of the
+    best model (None if there was none in time), whether the search
+    finished (the best model is optimal, or there is no plan up to the
+    horizon) and the last grounded step. metrics works as for solve_horizon.
+    """
+    times = {} if metrics is None else metrics
+    began = time.perf_counter()
+    if horizon > grounded:
+        ground_horizon(ctl, grounded + 1, horizon)
+        grounded = horizon
+    grounded_at = time.perf_counter()
+    model = []
+
+    def on_model(m):
+        model[:] = m.symbols(shown=True)
+
+    deadline = time.perf_counter() + budget
+    ctl.assign_external(query(horizon, literals), True)
+    with ctl.solve(on_model=on_model, async_=True) as handle:
+        while not handle.wait(min(0.01, budget)):
+            if time.perf_counter() >= deadline or (stop is not None and stop.is_set()):
+                handle.cancel()
+        result = handle.get()
+    telemetry.count(metrics, ctl)
+    ctl.assign_external(query(horizon, literals), False)
+    times["ground"] = times.get("ground", 0) + grounded_at - began
+    times["solve"] = times.get("solve", 0) + time.perf_counter() - grounded_at
+    return model or None, result.exhausted, grounded
+
+def solve(map_facts, threads=c.SOLVER_THREADS):
+    """Solve with the fixed horizon maxT from sokoban.lp"""
+    ctl = clingo.control.Control(["--opt-mode=opt", f"-t{threads}"] + PUSH_ARGS + HEURISTIC_ARGS)
+    state = hashlib.sha1(map_facts.encode()).hexdigest()[:12]
+    with telemetry.call("solve", None, os.path.basename(ENCODING), state) as record:
+        try:
+            began = time.perf_counter()
+            ctl.load(ENCODING)
+            ctl.add("base", [], map_facts)
+            ctl.ground([("base", [])])
+            max_t = ctl.get_const("maxT").number
+            ground_horizon(ctl, 1, max_t)
+            grounded_at = time.perf_counter()
+            ctl.assign_external(query(max_t), True)
+            result = ctl.solve(on_model=on_model)
+            record.update(ground=grounded_at - began, solve=time.perf_counter() - grounded_at, horizon=max_t)
+            telemetry.count(record, ctl)
+            if result.satisfiable and final_model is not None:
+                record["outcome"] = "solved"
+                return final_model
+            else:
+                record["outcome"] = "unsolvable"
+                return None
+        except Exception as e:
+            record["outcome"] = f"error: {e}"
+            print(e)
+
+def solve_incremental(map_facts, max_horizon=None, threads=c.SOLVER_THREADS, stop=None, start=0):
+    """Solve with the shortest horizon from `start` on that reaches the goal"""
+    ctl = clingo.control.Control(["--opt-mode=opt", f"-t{threads}"] + PUSH_ARGS + HEURISTIC_ARGS)
+    model = []
+
+    def on_model(m):
+        model[:] = m.symbols(shown=True)
+
     try:
-        ctl.load("sokoban.lp")
+        ctl.load(ENCODING)
         ctl.add("base", [], map_facts)
-        ctl.ground([("base", [])])
-        result = ctl.solve(on_model=on_model)
-        print(map_facts)
-        if result.satisfiable and final_model is not None:
-           
-            return final_model
-        else:
+        ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+        horizon, _ = solve_horizon(ctl, 0, max_horizon, on_model, stop, start=start)
+        if horizon is None:
             return None
+        return model
     except Exception as e:
         print(e)
 
+def solve_pushes(map_facts, crate_count, limit, threads=c.SOLVER_THREADS, stop=None, start=0, metrics=None):
+    """
+    Solve with sokoban_push.lp, where every time step is one push and
+    `limit` pushes are allowed per crate. The search starts at `start`
+    pushes. Returns the symbols of the plan with the fewest pushes or
+    None if there is none. metrics works as for solve_horizon.
+    """
+    ctl = clingo.control.Control([f"-t{threads}", "-c", f"maxPush={limit}"] + HEURISTIC_ARGS)
+    model = []
+
+    def on_model(m):
+        model[:] = m.symbols(shown=True)
+
+    began = time.perf_counter()
+    ctl.load(PUSH_ENCODING)
+    ctl.add("base", [], map_facts)
+    ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+    if metrics is not None:
+        metrics["ground"] = metrics.get("ground", 0) + time.perf_counter() - began
+    horizon, _ = solve_horizon(ctl, 0, limit * crate_count, on_model, stop, metrics, start=start)
+    if metrics is not None:
+        metrics["horizon"] = horizon
+    if horizon is None:
+        return None
+    return model
+
+def push_steps(state, crates, symbols):
+    """
+    Single step directions for the push/3 plan of solve_pushes. crates
+    lists the crate tiles in the order they were named b1, b2, ... by
+    map_loader.build_asp_facts.
+    """
+    state = state.copy()
+    tiles = {f"b{i}": state.index(pos) for i, pos in enumerate(crates, start = 1)}
+    pushes = sorted((s for s in symbols if s.match("push", 3)), key=lambda s: s.arguments[2].number)
+    steps = []
+    for s in pushes:
+        crate = s.arguments[0].name
+        d = state.offset(*native_solver.DIRECTION_OFFSETS[s.arguments[1].name])
+        box = tiles[crate]
+        parent = state.walk()
+        if box - d not in parent:
+            return None
+        steps += native_solver.path_to(parent, box - d) + [d]
+        tiles[crate] = state.push(box, d)
+    return [state.direction(d) for d in steps]
+
+def push_plan(level, player_pos, crates, stop=None, metrics=None):
+    """Step directions from sokoban_push.lp for the crates dict of game.py"""
+    bound = bounds.lower_bound(level, player_pos, crates, c.PUSH_LIMIT)
+    if bound is None:
+        return None
+    facts = map_loader.build_asp_facts(level, player_pos, crates, c.PUSH_LIMIT)
+    symbols = solve_pushes(facts, len(crates), c.PUSH_LIMIT, stop=stop, start=bound[0], metrics=metrics)
+    if symbols is None:
+        return None
+    state = BoardState.from_level(level, crates, player_pos)
+    return push_steps(state, list(crates), symbols)
+
 def getDirection(dir,x,y):
     match dir:
         case "moveUp":
@@ -44,22 +253,374 @@ def getDirection(dir,x,y):
             x+=1
     return x,y
 
-def hint(map_facts):
-    results = solve(map_facts)
+def first_move(symbols):
+    """Return the do/2 action with the lowest time step"""
+    moves = [s for s in symbols if s.match("do", 2)]
+    if not moves:
+        return None
+    return min(moves, key=lambda s: s.arguments[1].number).arguments[0]
+
+def next_position(results):
+    """Tile the player should step on next, or None without a plan"""
     try:
-        move = str(results[0])
-        dirMatch = re.split(r'\(',move)
-        dir = dirMatch[1]
-        match = re.findall(r'\d+', move)
-        if len(match) >= 2:
-            first_two_digits = "".join(match[:2])
-            x = int(first_two_digits[0])
-            y = int(first_two_digits[1])
-
-        x,y = getDirection(dir,x,y)
-
-        return x, y
-    
+        move = first_move(results)
+        x = move.arguments[1].number
+        y = move.arguments[2].number
+        return getDirection(move.name, x, y)
     except:
         return None
-    
+
+def plan_steps(results):
+    """Step directions of the do/2 actions in time order"""
+    moves = sorted((s for s in results if s.match("do", 2)), key=lambda s: s.arguments[1].number)
+    return [getDirection(s.arguments[0].name, 0, 0) for s in moves]
+
+def hint(map_facts):
+    return next_position(solve(map_facts))
+
+def encoding_name(backend):
+    """What a hint backend solves with, for the telemetry records"""
+    names = {"clingo": os.path.basename(ENCODING), "push": os.path.basename(PUSH_ENCODING)}
+    return names.get(backend, backend)
+
+
+class Session:
+    """
+    One long-lived clingo control per loaded level.
+    The static part (walls, goals, deadlocks, actions) is grounded once,
+    every query only switches the start/pushes_used externals to the current
+    player and crate positions and solves again.
+    With config.GROUND_CACHE_DIR the program is grounded up to
+    GROUND_CACHE_HORIZON at once and saved as aspif (ground_cache.py),
+    later sessions of the level load it instead of grounding. Such a
+    program can not grow, longer plans fall back to a growing control.
+    With config.HINT_SERVER hints and checks go to hint_server.py and
+    the level is only grounded here when the server can not answer.
+    clingo runs with the given configuration of portfolio.py, else the
+    one of the level's tuned profile.
+    """
+    def __init__(self, level, configuration=None, threads=None):
+        self.level = level
+        self.name = level["name"]
+        self.crate_count = len(level["boxes"])
+        self.configuration, options = portfolio.choose(self.name, configuration)
+        self.args = ["--opt-mode=opt", f"-t{threads or c.SOLVER_THREADS}"] + PUSH_ARGS + HEURISTIC_ARGS + options
+        self.static = map_loader.build_static_facts(level, self.crate_count)
+        # the game solves on a worker thread, a cancelled solve may still be finishing
+        self.lock = threading.Lock()
+        self.max_horizon = horizon_limit(level, self.crate_count)
+        self.ctl = None
+        # a newer hint of this game drops the older one on the server
+        self.client = hint_client.new_client()
+        # Sessions of the portfolio backend, made at its first solve
+        self.members = None
+        if c.HINT_SERVER is None:
+            self.prepare()
+        if c.HINT_CACHE_DIR is not None:
+            hint_cache.load(self.hint_cache_path(), self.name)
+
+    def prepare(self):
+        """Ground the level unless it is already"""
+        if self.ctl is not None:
+            return
+        if c.GROUND_CACHE_DIR is not None:
+            self.open_cache()
+        else:
+            self.ground()
+
+    def ground(self):
+        """A control that grounds one more step whenever the horizon grows"""
+        self.ctl = clingo.control.Control(self.args)
+        self.ctl.load(ENCODING)
+        self.ctl.add("base", [], self.static)
+        self.ctl.ground([("base", []), ("session", []), ("check", [clingo.Number(0)])])
+        self.horizon = 0
+        # last step of a program that can not grow, None if it can
+        self.fixed = None
+        # externals by program literal instead of symbol, see ground_cache.py
+        self.literals = None
+        self.active = set()
+
+    def open_cache(self):
+        """Load the ground program from the cache, or ground it and record it there"""
+        key = ground_cache.cache_key(self.static, self.args)
+        # saving evicts the other keys of a name, so every configuration has its own
+        name = self.name if self.configuration == "default" else f"{self.name}.{self.configuration}"
+        cache = ground_cache.GroundCache(c.GROUND_CACHE_DIR, name, key)
+        hit = cache.load()
+        if hit is None:
+            def build(ctl):
+                ctl.load(ENCODING)
+                ctl.add("base", [], self.static)
+                parts = [("base", []), ("session", []), ("check", [clingo.Number(0)])]
+                for t in range(1, c.GROUND_CACHE_HORIZON + 1):
+                    parts.extend([("step", [clingo.Number(t)]), ("check", [clingo.Number(t)])])
+                ctl.ground(parts)
+
+            hit = c.GROUND_CACHE_HORIZON, cache.record(self.args, build)
+            cache.save(*hit)
+        self.fixed, self.literals = hit
+        self.horizon = self.fixed
+        self.ctl = clingo.control.Control(self.args)
+        self.ctl.load(cache.aspif)
+        # every state starts from all externals false, whatever the file says
+        for literal in self.literals.values():
+            self.ctl.assign_external(literal, False)
+        self.active = set()
+
+    def external(self, sym):
+        return sym if self.literals is None else self.literals[str(sym)]
+
+    def hint_cache_path(self):
+        return os.path.join(c.HINT_CACHE_DIR, self.name + ".json")
+
+    def remote(self, op, player_pos, crates, stop=None):
+        """Reply of config.HINT_SERVER, None when there is no server or it could not answer"""
+        if c.HINT_SERVER is None:
+            return None
+        try:
+            reply = hint_client.request(
+                c.HINT_SERVER, hint_client.state_message(op, "game", self.name, player_pos, crates), stop,
+                client=self.client,
+            )
+        except hint_client.ServerError as e:
+            print(e)
+            return None
+        if reply is None or reply["status"] != "ok":
+            return None
+        return reply
+
+    def save_hints(self):
+        if c.HINT_CACHE_DIR is not None:
+            hint_cache.save(self.hint_cache_path(), self.name)
+
+    def set_state(self, player_pos, crates):
+        """Turn on the externals for this state and turn off the old ones"""
+        px, py = player_pos
+        state = {clingo.Function("start", [clingo.Number(px), clingo.Number(py), clingo.Function("p")])}
+        for i, ((bx, by), count) in enumerate(crates.items(), start = 1):
+            crate = clingo.Function(f"b{i}")
+            state.add(clingo.Function("start", [clingo.Number(bx), clingo.Number(by), crate]))
+            state.add(clingo.Function("pushes_used", [crate, clingo.Number(count)]))
+
+        for sym in self.active - state:
+            self.ctl.assign_external(self.external(sym), False)
+        for sym in state - self.active:
+            self.ctl.assign_external(self.external(sym), True)
+        self.active = state
+
+    def solve(self, player_pos, crates, stop=None, metrics=None):
+        """
+        Symbols of a shortest plan, None without one (states bounds.lower_bound
+        rules out are not solved). metrics works as for solve_horizon, the
+        grounding of the level is counted there when this call does it.
+        """
+        bound = bounds.lower_bound(self.level, player_pos, crates, c.PUSH_LIMIT)
+        if bound is None:
+            if metrics is not None:
+                metrics["outcome"] = "bound"
+            return None
+        model = []
+
+        def on_model(m):
+            model[:] = m.symbols(shown=True)
+
+        times = {} if metrics is None else metrics
+        times["configuration"] = self.configuration
+        with self.lock:
+            try:
+                began = time.perf_counter()
+                self.prepare()
+                start = bound[1]
+                if self.fixed is not None:
+                    if start <= self.fixed:
+                        times["ground"] = times.get("ground", 0) + time.perf_counter() - began
+                        self.set_state(player_pos, crates)
+                        found, _ = solve_horizon(
+                            self.ctl, self.horizon, min(self.fixed, self.max_horizon), on_model, stop,
+                            metrics, start=start, literals=self.literals,
+                        )
+                        times["horizon"] = found
+                        if found is not None:
+                            return model
+                        if self.fixed >= self.max_horizon or (stop is not None and stop.is_set()):
+                            return None
+                        began = time.perf_counter()
+                    # the plan is longer than the fixed program
+                    start = max(start, self.fixed + 1)
+                    self.ground()
+                times["ground"] = times.get("ground", 0) + time.perf_counter() - began
+                self.set_state(player_pos, crates)
+                found, self.horizon = solve_horizon(
+                    self.ctl, self.horizon, self.max_horizon, on_model, stop, metrics, start=start
+                )
+                times["horizon"] = found
+                if found is None:
+                    return None
+                return model
+            except Exception as e:
+                times["outcome"] = f"error: {e}"
+                print(e)
+
+    def plan(self, player_pos, crates, backend=None, stop=None, metrics=None):
+        """
+        Step directions from the clingo, push, native, race or portfolio
+        backend, None without a plan. metrics gets the statistics of the
+        clingo solves.
+        """
+        backend = backend or c.HINT_BACKEND
+        if backend == "native":
+            return native_solver.crate_plan(self.level, player_pos, crates, stop)
+        if backend == "push":
+            try:
+                return push_plan(self.level, player_pos, crates, stop, metrics)
+            except Exception as e:
+                if metrics is not None:
+                    metrics["outcome"] = f"error: {e}"
+                print(e)
+                return None
+        if backend == "race":
+            return native_solver.race(
+                lambda stop: self.plan(player_pos, crates, "clingo", stop, metrics),
+                lambda stop: native_solver.crate_plan(self.level, player_pos, crates, stop),
+                stop=stop,
+            )
+        if backend == "portfolio":
+            return self.portfolio_plan(player_pos, crates, stop, metrics)
+        results = self.solve(player_pos, crates, stop, metrics)
+        if results is None:
+            return None
+        return plan_steps(results)
+
+    def portfolio_plan(self, player_pos, crates, stop=None, metrics=None):
+        """
+        Race one single threaded Session per configuration of config.PORTFOLIO,
+        the first to finish answers, with a plan or that there is none.
+        """
+        if self.members is None:
+            self.members = [Session(self.level, name, threads=1) for name in c.PORTFOLIO]
+
+        def job(member):
+            def run(stop):
+                own = {}
+                results = member.solve(player_pos, crates, stop, own)
+                # race only takes answers that are not None
+                if stop.is_set() or own.get("outcome", "").startswith("error"):
+                    return None
+                return own, results
+            return run
+
+        answer = native_solver.race(*(job(member) for member in self.members), stop=stop)
+        if answer is None:
+            return None
+        own, results = answer
+        if metrics is not None:
+            metrics.update(own)
+        if results is None:
+            return None
+        return plan_steps(results)
+
+    def hint_anytime(self, player_pos, crates, budget=None, stop=None):
+        """
+        Next tile for the player within budget seconds (c.HINT_BUDGET) and
+        whether it belongs to an optimal plan. The horizon starts at the
+        lower bound and doubles up to c.ANYTIME_HORIZON while there is no
+        plan. Without a plan in time the tile is None and not proven, a
+        longer plan may still exist (hint() waits for it). Only optimal
+        plans go to hint_cache, a cut off plan is asked again at the next hint.
+        """
+        with telemetry.call(
+            "anytime", self.name, encoding_name("clingo"), telemetry.state_key(player_pos, crates)
+        ) as record:
+            state = BoardState.from_level(self.level, crates, player_pos)
+            pushes = hint_cache.get(self.name, state)
+            if pushes is not None:
+                record["outcome"] = "cached"
+                step = first_step(state, pushes)
+                if step is None:
+                    return None, True
+                return (player_pos[0] + step[0], player_pos[1] + step[1]), True
+
+            bound = bounds.lower_bound(self.level, player_pos, crates, c.PUSH_LIMIT)
+            if bound is None:
+                record["outcome"] = "bound"
+                return None, True
+
+            results, proven = None, False
+            if bound[1] <= c.ANYTIME_HORIZON:
+                with self.lock:
+                    try:
+                        began = time.perf_counter()
+                        self.prepare()
+                        if self.fixed is not None and self.fixed < c.ANYTIME_HORIZON:
+                            self.ground()
+                        record["ground"] = time.perf_counter() - began
+                        self.set_state(player_pos, crates)
+                        deadline = time.perf_counter() + (budget or c.HINT_BUDGET)
+                        horizon = max(bound[1], 1)
+                        while time.perf_counter() < deadline:
+                            results, proven, self.horizon = solve_anytime(
+                                self.ctl, self.horizon, horizon, deadline - time.perf_counter(), stop,
+                                self.literals, record,
+                            )
+                            record["horizon"] = horizon
+                            # the shorter horizons had no plan, so the best one up to this one is optimal
+                            if results is not None or not proven or horizon >= c.ANYTIME_HORIZON:
+                                break
+                            horizon = min(2 * horizon, c.ANYTIME_HORIZON)
+                    except Exception as e:
+                        record["outcome"] = f"error: {e}"
+                        print(e)
+                        return None, False
+            if results is None:
+                record["outcome"] = "unsolvable" if proven else "cut off"
+            else:
+                record["outcome"] = "optimal" if proven else "cut off"
+        if results is None:
+            # no plan up to ANYTIME_HORIZON does not rule out a longer one
+            return None, False
+        steps = plan_steps(results)
+        if proven:
+            hint_cache.put(self.name, state, steps)
+        if not steps:
+            return None, proven
+        dx, dy = steps[0]
+        return (player_pos[0] + dx, player_pos[1] + dy), proven
+
+    def solvable(self, player_pos, crates, stop=None):
+        """Whether the state still has a plan, asked from config.HINT_SERVER first"""
+        with telemetry.call(
+            "check", self.name, encoding_name("clingo"), telemetry.state_key(player_pos, crates)
+        ) as record:
+            reply = self.remote("check", player_pos, crates, stop)
+            if reply is not None:
+                record["outcome"] = "server"
+                return reply["solvable"]
+            results = self.solve(player_pos, crates, stop, record)
+            record.setdefault("outcome", telemetry.outcome(results, stop))
+            return results is not None
+
+    def hint(self, player_pos, crates, backend=None, stop=None):
+        """Next tile for the player, answered from hint_cache when the state was planned before"""
+        backend = backend or c.HINT_BACKEND
+        with telemetry.call(
+            "hint", self.name, encoding_name(backend), telemetry.state_key(player_pos, crates)
+        ) as record:
+            reply = self.remote("hint", player_pos, crates, stop)
+            if reply is not None:
+                record["outcome"] = "server"
+                return tuple(reply["tile"]) if reply["tile"] else None
+            state = BoardState.from_level(self.level, crates, player_pos)
+            pushes = hint_cache.get(self.name, state)
+            if pushes is None:
+                steps = self.plan(player_pos, crates, backend, stop, record)
+                record.setdefault("outcome", telemetry.outcome(steps, stop))
+                if steps is None:
+                    return None
+                pushes = hint_cache.put(self.name, state, steps)
+            else:
+                record["outcome"] = "cached"
+        step = first_step(state, pushes)
+        if step is None:
+            return None
+        return player_pos[0] + step[0], player_pos[1] + step[1]
@@ -0,0 +1,178 @@
+from board import BoardState
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+# same names as the move and push actions of sokoban.lp
+DIRECTION_NAMES = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+
+def in_area(level, pos):
+    """Same 0..width x 0..height area as the coordinate facts"""
+    x, y = pos
+    return 0 <= x <= level["width"] and 0 <= y <= level["height"]
+
+def floor_cells(level):
+    """Tiles the player can walk to from the start position, boxes ignored"""
+    walls = level["walls"]
+    seen = {level["player"]}
+    todo = [level["player"]]
+    while todo:
+        x, y = todo.pop()
+        for dx, dy in DIRECTIONS:
+            nxt = (x + dx, y + dy)
+            if nxt not in seen and nxt not in walls and in_area(level, nxt):
+                seen.add(nxt)
+                todo.append(nxt)
+    return seen
+
+def pull_distances(level, starts, floor=None):
+    """
+    Reverse search from the start squares by pulling a single box.
+    A pull from B to B+d needs B+d and B+2d (where the player ends up)
+    to be floor, which is exactly a push from B+d back to B.
+    Returns the least number of pushes from every reached square to
+    one of the start squares, other boxes are ignored.
+    """
+    if floor is None:
+        floor = floor_cells(level)
+    dist = {s: 0 for s in starts if s in floor}
+    frontier = list(dist)
+    while frontier:
+        nxt_frontier = []
+        for x, y in frontier:
+            for dx, dy in DIRECTIONS:
+                box = (x + dx, y + dy)
+                player = (x + 2 * dx, y + 2 * dy)
+                if box in dist or box not in floor or player not in floor:
+                    continue
+                dist[box] = dist[(x, y)] + 1
+                nxt_frontier.append(box)
+        frontier = nxt_frontier
+    return dist
+
+def dead_squares(level):
+    """
+    Floor tiles from which no box can ever be pushed onto a goal.
+    Besides corners this finds boxes stuck along a wall without a goal
+    and dead ends of corridors.
+    """
+    floor = floor_cells(level)
+    alive = pull_distances(level, level["goals"], floor)
+    return floor - set(alive)
+
+def push_squares(level, floor=None, dead=None):
+    """
+    Player tiles and directions of every push that is possible on the
+    static map: the box tile and the tile behind it are floor and the
+    box does not end up on a dead square.
+    """
+    if floor is None:
+        floor = floor_cells(level)
+    if dead is None:
+        dead = dead_squares(level)
+    pushes = set()
+    for x, y in floor:
+        for name, (dx, dy) in DIRECTION_NAMES.items():
+            box = (x + dx, y + dy)
+            target = (x + 2 * dx, y + 2 * dy)
+            if box in floor and target in floor and target not in dead:
+                pushes.add((x, y, name))
+    return pushes
+
+def goal_distances(level, floor=None):
+    """Push distances to every single goal, {goal: {tile: pushes}}"""
+    if floor is None:
+        floor = floor_cells(level)
+    return {goal: pull_distances(level, [goal], floor) for goal in sorted(level["goals"])}
+
+def assign_goals(boxes, goal_dists):
+    """
+    Goal for every box: greedily the closest free goal by push distance,
+    shortest pairs first. boxes maps a box name to its tile, boxes that
+    reach no free goal get none.
+    """
+    pairs = []
+    for goal, dist in goal_dists.items():
+        for name, pos in boxes.items():
+            if pos in dist:
+                pairs.append((dist[pos], name, goal))
+    assigned = {}
+    taken = set()
+    for _, name, goal in sorted(pairs):
+        if name not in assigned and goal not in taken:
+            assigned[name] = goal
+            taken.add(goal)
+    return assigned
+
+def goal_dist_facts(level, floor=None):
+    """goal_dist(X,Y,D): pushes from X,Y to the closest goal, for the #heuristic of the encodings"""
+    dist = pull_distances(level, level["goals"], floor)
+    return [f"goal_dist({x}, {y}, {d})." for (x, y), d in sorted(dist.items())]
+
+def target_dist_facts(level, boxes, limit, floor=None):
+    """
+    target_dist(B,X,Y,D): pushes from X,Y to the goal assigned to box B.
+    Only tiles within `limit` pushes are listed, a box never gets further.
+    """
+    goal_dists = goal_distances(level, floor)
+    lines = []
+    for name, goal in sorted(assign_goals(boxes, goal_dists).items()):
+        for (x, y), d in sorted(goal_dists[goal].items()):
+            if d <= limit:
+                lines.append(f"target_dist({name}, {x}, {y}, {d}).")
+    return lines
+
+def dead_square_facts(level):
+    return "\n".join(f"dead({x}, {y})." for (x, y) in sorted(dead_squares(level)))
+
+
+class Detector:
+    """
+    Cheap deadlock tests for a BoardState after a move, so the game can
+    say a position is lost without asking a solver. A position is dead
+    when a box off goal stands on a dead square, needs more pushes to
+    reach any goal than it has left, or is frozen: blocked on both axes
+    by walls, dead squares or other frozen boxes. Frozen covers 2x2
+    blocks of boxes and walls.
+    """
+    def __init__(self, level, limit):
+        self.limit = limit
+        index = BoardState.from_level(level, boxes=()).index
+        floor = floor_cells(level)
+        self.dist = {index(pos): d for pos, d in pull_distances(level, level["goals"], floor).items()}
+
+    def deadlocked(self, state, box=None):
+        """Whether state is lost, only the boxes next to `box` are checked when it is given"""
+        if box is None:
+            boxes = state.box_cells()
+        else:
+            boxes = [box] + [box + d for d in self.offsets(state) if state.has_box(box + d)]
+        for i in boxes:
+            if state.is_goal(i):
+                continue
+            dist = self.dist.get(i)
+            if dist is None or dist > self.limit - state.pushes[i]:
+                return True
+            if self.frozen(state, i, frozenset()):
+                return True
+        return False
+
+    def offsets(self, state):
+        return (-state.stride, state.stride, -1, 1)
+
+    def frozen(self, state, i, seen):
+        """Box i can move on neither axis, boxes in seen count as walls"""
+        seen = seen | {i}
+        return self.blocked(state, i, 1, seen) and self.blocked(state, i, state.stride, seen)
+
+    def blocked(self, state, i, d, seen):
+        before, after = i - d, i + d
+        if state.is_solid(before) or state.is_solid(after):
+            return True
+        if before not in self.dist and after not in self.dist:
+            return True
+        for n in (before, after):
+            if n in seen:
+                return True
+            if state.has_box(n) and self.frozen(state, n, seen):
+                return True
+        return False
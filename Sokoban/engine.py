@@ -0,0 +1,122 @@
+import deadlock
+from board import BoardState
+
+MOVES = deadlock.DIRECTION_NAMES
+
+
+class Engine:
+    """
+    The rules of a running level without any drawing, used by game.py and
+    sokoban_text.py and cheap enough to simulate many sessions at once.
+    A box may be pushed max_pushes times: with destroy (game.py) the last
+    of those pushes breaks the crate and loses the level, without it
+    (the text game) a box that used them all can not move any more.
+    After every push deadlock.Detector decides whether the level is lost.
+    """
+    def __init__(self, level, max_pushes, origin=0, destroy=False, detector=None):
+        self.level = level
+        self.max_pushes = max_pushes
+        self.origin = origin
+        self.destroy = destroy
+        if detector is None:
+            detector = deadlock.Detector(level, max_pushes - 1 if destroy else max_pushes)
+        self.detector = detector
+        self.reset()
+
+    def reset(self):
+        """Back to the start of the level"""
+        self.board = BoardState.from_level(self.level, origin=self.origin)
+        self.moves = 0
+        self.lost = False
+        self.reason = ""
+        self.destroyed = []
+        # (player, boxes, lost, reason, pushed box tile, its pushes) per move for undo
+        self.history = []
+
+    def clone(self):
+        """Copy of the current state that shares the level and detector, without history"""
+        other = Engine.__new__(Engine)
+        other.level = self.level
+        other.max_pushes = self.max_pushes
+        other.origin = self.origin
+        other.destroy = self.destroy
+        other.detector = self.detector
+        other.board = self.board.copy()
+        other.moves = self.moves
+        other.lost = self.lost
+        other.reason = self.reason
+        other.destroyed = list(self.destroyed)
+        other.history = []
+        return other
+
+    @property
+    def player(self):
+        return self.board.pos(self.board.player)
+
+    def crates(self):
+        """Box tiles with their pushes used"""
+        return self.board.crates()
+
+    def completed(self):
+        return self.board.completed()
+
+    def can_step(self, dx, dy):
+        return self.board.can_move(dx, dy, None if self.destroy else self.max_pushes)
+
+    def step(self, dx, dy):
+        """
+        Walk or push one tile. Returns None if the move is not allowed,
+        -1 for a walk, else the tile the pushed box landed on.
+        """
+        board = self.board
+        player, boxes = board.player, board.boxes
+        box = board.player + board.offset(dx, dy)
+        used = board.pushes[box]
+        landed = board.move(dx, dy, None if self.destroy else self.max_pushes)
+        if landed is None:
+            return None
+        self.history.append((player, boxes, self.lost, self.reason, box if landed >= 0 else None, used))
+        self.moves += 1
+        if landed < 0:
+            return landed
+
+        if self.destroy and board.pushes[landed] >= self.max_pushes:
+            self.destroyed.append(board.pos(landed))
+            board.remove_box(landed)
+            self.lose("a crate broke")
+        elif not self.lost and self.detector.deadlocked(board, landed):
+            self.lose("a box can no longer reach a goal")
+        return landed
+
+    def apply(self, move):
+        """step() for a direction name ("up") or a (dx, dy) pair"""
+        dx, dy = MOVES[move] if isinstance(move, str) else move
+        return self.step(dx, dy)
+
+    def apply_moves(self, plan):
+        """Apply moves in order until one is not allowed, returns how many were applied"""
+        for n, move in enumerate(plan):
+            if self.apply(move) is None:
+                return n
+        return len(plan)
+
+    def undo(self):
+        """Take back the last move, False if there is none"""
+        if not self.history:
+            return False
+        player, boxes, self.lost, self.reason, box, used = self.history.pop()
+        board = self.board
+        if box is not None:
+            landed = box + (box - player)
+            if self.destroy and used + 1 >= self.max_pushes:
+                self.destroyed.pop()
+            board.pushes[landed] = 0
+            board.pushes[box] = used
+        board.player = player
+        board.boxes = boxes
+        self.moves -= 1
+        return True
+
+    def lose(self, reason):
+        self.lost = True
+        self.reason = reason
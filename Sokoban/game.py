@@ -4,6 +4,10 @@ import config as c
 from components.button import Button
 import map_loader
 import controller 
+from engine import Engine
+from renderer import Renderer
+import telemetry
+from worker import SolverWorker
 
 pygame.init()
 screen = pygame.display.set_mode((c.SCREEN_WIDTH, c.SCREEN_HEIGHT))
@@ -32,6 +36,15 @@ goal_img = pygame.transform.scale(goal_img, (c.TILE_SIZE, c.TILE_SIZE))
 floor_img = pygame.image.load("elements/floor.png").convert_alpha()
 floor_img = pygame.transform.scale(floor_img, (c.TILE_SIZE, c.TILE_SIZE))
 
+renderer = Renderer(screen, {
+    "crate": crate_img,
+    "wall": wall_img,
+    "broken_crate": broken_crate_img,
+    "player": player_img,
+    "goal": goal_img,
+    "floor": floor_img,
+}, font)
+
 player_x, player_y = 0,0
 
 crates = dict()
@@ -41,10 +54,23 @@ hints = []
 destroyed_crates = set()
 no_solution = False
 banner_text = ""
+session = None
+# rules of the level, see engine.py
+engine = None
+# hint/check solves run here so the loop keeps drawing
+worker = SolverWorker()
 
 def load_initial_state():
-    global crates, walls, goals, no_solution, player_x, player_y, banner_text, destroyed_crates, move_count, hints, map
+    global crates, walls, goals, no_solution, player_x, player_y, banner_text, destroyed_crates, move_count, hints, map, session, engine
     map = map_loader.load_level_from_file(map_name)
+    worker.cancel()
+    if session is None or session.name != map["name"]:
+        if session is not None:
+            session.save_hints()
+        session = controller.Session(map)
+        engine = Engine(map, c.MAX_PUSHES, destroy=True)
+    else:
+        engine.reset()
     no_solution = False
     player_x, player_y = map["player"]
     walls = map["walls"]
@@ -52,192 +78,98 @@ def load_initial_state():
     banner_text = ""
     c.GRID_WIDTH = map["width"]
     c.GRID_HEIGHT = map["height"]
-    crates = dict()
-    for crate in map["boxes"]:
-        crates[crate] = 0
+    crates = engine.crates()
     destroyed_crates = set()
     move_count = 0
     hints = []
+    renderer.set_level(walls, goals)
 
 load_initial_state()
 
-def draw_grid():
-    """Draw floor tiles"""
-    for x in range(c.GRID_WIDTH):
-        for y in range(c.GRID_HEIGHT):
-            screen.blit(floor_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-            
-
-def draw_player(x, y):
-    """Draw player sprite"""
-    screen.blit(player_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-
-def draw_walls(walls):
-    """Draw wall sprites"""
-    for x, y in walls:
-        screen.blit(wall_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-
-def draw_crates(crates):
-    for (x, y) in crates:
-        screen.blit(crate_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-        if (x, y) in goals:
-            rect = pygame.Rect(
-                x * c.TILE_SIZE,
-                y * c.TILE_SIZE + c.TOP_BAR_HEIGHT,
-                c.TILE_SIZE,
-                c.TILE_SIZE
-            )
-            pygame.draw.rect(screen, (0, 255, 0), rect, 3)
-
-def draw_push_counters(crates):
-    """Draw remaining pushes on each crate"""
-    small_font = pygame.font.SysFont(None, 24)
-    for (x, y), push_count in crates.items():
-        remaining = c.MAX_PUSHES - push_count
-        
-        center_x = x * c.TILE_SIZE + c.TILE_SIZE - 15
-        center_y = y * c.TILE_SIZE + c.TOP_BAR_HEIGHT + 15
-        
-        if remaining == 1:
-            color = (255, 0, 0)
-        elif remaining <= 3:
-            color = (255, 255, 0)
-        else:
-            color = (0, 255, 0)
-        
-        pygame.draw.circle(screen, color, (center_x, center_y), 12)
-        pygame.draw.circle(screen, (0, 0, 0), (center_x, center_y), 12, 2)
-        
-        text = small_font.render(str(remaining), True, (0, 0, 0))
-        text_rect = text.get_rect(center=(center_x, center_y))
-        screen.blit(text, text_rect)
-
-def draw_goals(goals):
-    """Draw goal points"""
-    for x, y in goals:
-        screen.blit(goal_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-
-def draw_destroyed():
-    for (x, y) in destroyed_crates:
-        screen.blit(broken_crate_img, (x * c.TILE_SIZE, y * c.TILE_SIZE + c.TOP_BAR_HEIGHT))
-
-def draw_top_bar():
-    """Draw menu bar and buttons"""
-    pygame.draw.rect(
-        screen,
-        c.TOP_BAR_COLOR,
-        pygame.Rect(0, 0, c.SCREEN_WIDTH, c.TOP_BAR_HEIGHT)
-    )
-
-    mouse_pos = pygame.mouse.get_pos()
-    for b in buttons:
-        b.update(mouse_pos)
-        b.draw()
-    moves_text = font.render(f"Moves: {move_count}", True, c.TEXT_COLOR)
-    moves_x = c.SCREEN_WIDTH - 250
-    screen.blit(moves_text, (moves_x, (c.TOP_BAR_HEIGHT - moves_text.get_height()) // 2))
-    
-    label = font.render(banner_text, True, c.TEXT_COLOR)
-    screen.blit(
-        label, 
-        (
-            c.SCREEN_WIDTH - label.get_width() - 10,
-            (c.TOP_BAR_HEIGHT - label.get_height()) // 2
-        )
-    )
-
-def draw_overlay(overlay_text):
-    """Draw won/game over screen"""
-    overlay = pygame.Surface((c.SCREEN_WIDTH, c.SCREEN_HEIGHT))
-    overlay.set_alpha(160)
-    overlay.fill((0, 0, 0))
-    screen.blit(overlay, (0, 0))
-
-    text = font.render(overlay_text, True, (255, 255, 255))
-    rect = text.get_rect(center=(c.SCREEN_WIDTH//2, c.SCREEN_HEIGHT//2))
-    screen.blit(text, rect)
-
-def draw_hint(hints):
-    """Draw next move as a point"""
-    for x,y in hints:
-        center_x = x * c.TILE_SIZE + c.TILE_SIZE // 2
-        center_y = y * c.TILE_SIZE + c.TILE_SIZE + c.TOP_BAR_HEIGHT// 2
-        pygame.draw.circle(
-            screen,
-            (255, 105, 180),
-            (center_x, center_y),
-            c.GOAL_RADIUS
-        )
-
-def in_bounds(x, y):
-    """Check within grid"""
-    return 0 <= x < c.GRID_WIDTH and 0 <= y < c.GRID_HEIGHT
-
-def destroy_crate(crate_at):
-    """Destroy crate when moved to much"""
-    global crates, destroyed_crates, no_solution
-    destroyed_crates.add(crate_at)
-    crates.pop(crate_at)
-    no_solution = True
-
 def try_move(dx, dy):
-    global player_x, player_y, crates, move_count, hints
-
-    target = (player_x + dx, player_y + dy)
-
-    if not in_bounds(*target):
-        return
+    global player_x, player_y, crates, move_count, hints, no_solution, banner_text
 
-    if target in walls:
+    was_lost = engine.lost
+    landed = engine.step(dx, dy)
+    if landed is None:
         return
-
-    if target in crates:
-        beyond = (target[0] + dx, target[1] + dy)
-
-        if not in_bounds(*beyond):
-            return
-        if beyond in walls or beyond in crates:
-            return
-        push_counter = crates[target]
-        crates.pop(target)
-        crates[beyond] = push_counter + 1
-        if crates[beyond] == c.MAX_PUSHES:
-            destroy_crate(beyond)
-
-    player_x, player_y = target
-    move_count += 1
+    cancel_solve()
+
+    if landed >= 0:
+        crates = engine.crates()
+        destroyed_crates.update(engine.destroyed)
+        if engine.lost and not was_lost:
+            no_solution = True
+            if not engine.destroyed:
+                banner_text = "deadlock"
+
+    player_x, player_y = engine.player
+    move_count = engine.moves
     hints = []
 
-def is_completed(crates, goals):
+def is_completed():
     """Check all crates on goals"""
-    if len(goals) == len(crates):
-        return all(crate in goals for crate in crates)
-    else:
-        return False
+    return engine.completed()
 
 def reset_game():
     load_initial_state()
 
 def check():
-    global no_solution, banner_text
-    map_facts = map_loader.build_asp_facts(map,(player_x,player_y),crates)
-    result = controller.solve(map_facts)
-    if result is None:
+    global banner_text, no_solution
+    if no_solution or engine.detector.deadlocked(engine.board):
         no_solution = True
-        banner_text= "no solution"
-    else:
-        banner_text = "still solvable"
+        banner_text = "no solution"
+        return
+    current, pos, snapshot = session, (player_x,player_y), dict(crates)
+    worker.submit("check", lambda stop: current.solvable(pos, snapshot, stop))
+    banner_text = "thinking..."
     
 def hint():
-    global no_solution
-    map_facts = map_loader.build_asp_facts(map,(player_x,player_y),crates)
-    try:
-        x, y = controller.hint(map_facts)
-        print(x,y)
-        hints.append((x,y))
-    except:
-        print("No solution")
+    global banner_text
+    current, pos, snapshot = session, (player_x,player_y), dict(crates)
+    if c.HINT_BUDGET is None or c.HINT_SERVER is not None:
+        worker.submit("hint", lambda stop: current.hint(pos, snapshot, stop=stop))
+    else:
+        worker.submit("anytime", lambda stop: current.hint_anytime(pos, snapshot, stop=stop))
+    banner_text = "thinking..."
+
+def cancel_solve():
+    """Drop a hint/check that is still solving an older state"""
+    global banner_text
+    if worker.busy():
+        worker.cancel()
+        banner_text = ""
+
+def finish_solve(kind, result):
+    """Show the answer of a background hint/check"""
+    global no_solution, banner_text
+    banner_text = ""
+    if kind == "failed":
+        # the solver gave up or broke, that says nothing about the state
+        banner_text = result
+    elif kind == "check":
+        if not result:
+            no_solution = True
+            banner_text= "no solution"
+        else:
+            banner_text = "still solvable"
+    elif kind == "anytime":
+        result, proven = result if result is not None else (None, False)
+        if result is not None:
+            hints.append(result)
+            banner_text = "hint shown" if proven else "hint (maybe not shortest)"
+        elif proven:
+            no_solution = True
+            banner_text = "no solution"
+        else:
+            # nothing within HINT_BUDGET, the Hint button without a budget waits for it
+            banner_text = "no hint yet"
+    elif result is None:
         no_solution = True
+        banner_text = "no solution"
+    else:
+        hints.append(result)
+        banner_text = "hint shown"
 
 def next():
     global map_name
@@ -268,6 +200,7 @@ while True:
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            session.save_hints()
             pygame.quit()
             sys.exit()
         
@@ -290,19 +223,19 @@ while True:
             player_x = max(0, min(c.GRID_WIDTH - 1, player_x))
             player_y = max(0, min(c.GRID_HEIGHT - 1, player_y))
 
-    #Call all draw events
-    screen.fill(c.BG_COLOR)
-    draw_top_bar()
-    draw_grid()
-    draw_walls(walls)
-    draw_goals(goals)
-    draw_crates(crates)
-    draw_push_counters(crates)
-    draw_destroyed()
-    draw_hint(hints)
-    draw_player(player_x, player_y)
-    if is_completed(crates, goals):
-        draw_overlay("Level Complete")
+    finished = worker.poll()
+    if finished is not None:
+        finish_solve(*finished)
+
+    mouse_pos = pygame.mouse.get_pos()
+    for b in buttons:
+        b.update(mouse_pos)
+
+    #Only the tiles that changed are drawn, see renderer.py
+    overlays = []
+    if is_completed():
+        overlays.append("Level Complete")
     if no_solution:
-        draw_overlay("No Solution")
-    pygame.display.flip()
\ No newline at end of file
+        overlays.append("No Solution")
+    status = telemetry.summary(telemetry.latest) if c.TELEMETRY_OVERLAY else None
+    renderer.draw((player_x, player_y), crates, destroyed_crates, hints, move_count, banner_text, buttons, overlays, status)
\ No newline at end of file
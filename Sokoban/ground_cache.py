@@ -0,0 +1,89 @@
+import glob
+import hashlib
+import json
+import os
+
+import clingo
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# sokoban.lp and the files it includes
+ENCODING_FILES = [os.path.join(HERE, "sokoban.lp"), os.path.join(HERE, "push_budget.lp")]
+
+# externals controller.Session switches, their program literals are saved
+EXTERNALS = [("start", 3), ("pushes_used", 2), ("query", 1)]
+
+
+def cache_key(facts, args, encoding_files=ENCODING_FILES):
+    """
+    Hash of everything the ground program depends on: the clingo version,
+    the encoding files, the command line (constants) and the static facts
+    of the level, so editing the map or an .lp file gives a new key.
+    """
+    h = hashlib.sha256()
+    h.update(clingo.__version__.encode())
+    for path in encoding_files:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    h.update(" ".join(args).encode())
+    h.update(facts.encode())
+    return h.hexdigest()[:16]
+
+def external_literals(ctl):
+    """str(symbol) -> program literal of every external a session switches"""
+    literals = {}
+    for name, arity in EXTERNALS:
+        for atom in ctl.symbolic_atoms.by_signature(name, arity):
+            literals[str(atom.symbol)] = atom.literal
+    return literals
+
+
+class GroundCache:
+    """
+    The ground program of one level as clingo aspif, next to a json file
+    with the horizon it was grounded to and the literals of its externals.
+    An aspif program has no symbolic atoms left, so a control that loaded
+    it is switched through those literals and can not ground more steps.
+    The program is written by a control that only grounds it, so nothing
+    a session solves or assigns ends up in the file. Saving removes the
+    files of the same level with another key.
+    """
+    def __init__(self, directory, name, key):
+        self.directory = directory
+        self.name = name
+        base = os.path.join(directory, f"{name}-{key}")
+        self.aspif = base + ".aspif"
+        self.meta = base + ".json"
+
+    def load(self):
+        """(horizon, literals) of the cached program, None if there is none"""
+        if not os.path.exists(self.aspif) or not os.path.exists(self.meta):
+            return None
+        with open(self.meta, "r") as f:
+            meta = json.load(f)
+        return meta["horizon"], meta["literals"]
+
+    def record(self, args, build):
+        """
+        Write the program build(ctl) grounds to the aspif file as a single
+        step and return the literals of its externals.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        partial = f"{self.aspif}.{os.getpid()}.tmp"
+        ctl = clingo.Control(args)
+        ctl.register_backend(clingo.BackendType.Aspif, partial)
+        build(ctl)
+        literals = external_literals(ctl)
+        # the step is only ended by a solve, the externals are all still false
+        ctl.solve()
+        # the backend writes the rest of the file when the control is freed
+        del ctl
+        os.replace(partial, self.aspif)
+        return literals
+
+    def save(self, horizon, literals):
+        """Mark the aspif file complete"""
+        for path in glob.glob(os.path.join(glob.escape(self.directory), glob.escape(self.name) + "-*")):
+            if path not in (self.aspif, self.meta):
+                os.remove(path)
+        with open(self.meta, "w") as f:
+            json.dump({"horizon": horizon, "literals": literals}, f)
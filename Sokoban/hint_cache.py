@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class HintCache:
+    """
+    Plans found by the hint solvers, kept per canonical state: the level,
+    the smallest tile the player can walk to, the box tiles and their push
+    counts. A plan is stored as its pushes, every state reached after one
+    of those pushes gets the rest of the plan, so following a hint is
+    answered from the cache. The least recently used states are dropped
+    once the cache is full.
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, level_id, state):
+        pushes = bytes(state.pushes[i] for i in state.box_cells())
+        return level_id, min(state.walk()), state.boxes, pushes
+
+    def get(self, level_id, state):
+        """Remaining pushes [(player tile, offset), ...] for this state or None"""
+        key = self.key(level_id, state)
+        with self.lock:
+            pushes = self.entries.get(key)
+            if pushes is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return pushes
+
+    def put(self, level_id, state, steps):
+        """Store a plan of step directions from state, returns its pushes"""
+        state = state.copy()
+        pushes = []
+        keys = [self.key(level_id, state)]
+        for dx, dy in steps:
+            d = state.offset(dx, dy)
+            target = state.player + d
+            if state.has_box(target):
+                pushes.append((state.player, d))
+                state.push(target, d)
+                keys.append(self.key(level_id, state))
+            else:
+                state.player = target
+
+        with self.lock:
+            for n, key in enumerate(keys):
+                self.entries[key] = pushes[n:]
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return pushes
+
+    def save(self, path, level_id):
+        """Write the entries of one level to a json file"""
+        # copied under the lock, the solver threads keep putting plans meanwhile
+        with self.lock:
+            entries = [
+                [player, boxes, pushes.hex(), plan]
+                for (lid, player, boxes, pushes), plan in self.entries.items()
+                if lid == level_id
+            ]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(entries, f)
+
+    def load(self, path, level_id):
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            entries = json.load(f)
+        with self.lock:
+            for player, boxes, pushes, plan in entries:
+                key = (level_id, player, boxes, bytes.fromhex(pushes))
+                self.entries[key] = [tuple(push) for push in plan]
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+
+def first_step(state, pushes):
+    """Direction of the next step towards the first push, None if nothing is left to push"""
+    if not pushes:
+        return None
+    stand, d = pushes[0]
+    if state.player != stand:
+        parent = state.walk()
+        if stand not in parent:
+            return None
+        while parent[stand] != state.player:
+            stand = parent[stand]
+        d = stand - state.player
+    return state.direction(d)
@@ -0,0 +1,85 @@
+"""
+Blocking client of hint_server.py. controller.Session (config.HINT_SERVER)
+and sokoban_text.ask_hint (sokoban_text.HINT_SERVER) ask the server first
+and only solve themselves when it can not answer.
+"""
+import itertools
+import json
+import os
+import socket
+import time
+
+# numbers the clients of this process, see new_client
+clients = itertools.count(1)
+
+
+class ServerError(Exception):
+    """the hint server could not be reached or closed the connection"""
+
+
+def parse_address(address):
+    """(host, port) for "host:port", anything else is the path of a unix socket"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def new_client():
+    """
+    Id for the requests of one game: the server drops a request when the
+    same client sends a newer one, so every game needs an id of its own.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{next(clients)}"
+
+def connect(address, timeout=None):
+    address = parse_address(address)
+    family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sock.close()
+        raise ServerError(f"no hint server at {address}: {e}") from e
+    return sock
+
+def request(address, message, stop=None, timeout=None, client=None):
+    """
+    Send one request and wait for its reply (a dict with "status").
+    Returns None when the stop event is set first, closing the connection
+    makes the server drop the request. A newer request of the same client
+    (new_client) drops this one, without a client nothing is dropped.
+    """
+    if client is not None:
+        message = dict(message, client=client)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with connect(address, 1) as sock:
+        try:
+            sock.sendall(json.dumps(message).encode() + b"\n")
+            sock.settimeout(0.05)
+            data = b""
+            while not data.endswith(b"\n"):
+                if stop is not None and stop.is_set():
+                    return None
+                if deadline is not None and time.monotonic() > deadline:
+                    raise ServerError(f"no reply within {timeout} s")
+                try:
+                    chunk = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    raise ServerError("the hint server closed the connection")
+                data += chunk
+        except OSError as e:
+            raise ServerError(f"hint server failed: {e}") from e
+    return json.loads(data)
+
+def state_message(op, rules, name, player_pos, crates):
+    """Request for a state, crates maps box tiles to their pushes used"""
+    return {
+        "op": op,
+        "rules": rules,
+        "map": name,
+        "player": list(player_pos),
+        "crates": [[x, y, used] for (x, y), used in crates.items()],
+    }
@@ -0,0 +1,348 @@
+"""
+Local hint service for many games at once: one pool of solver processes,
+one plan cache and every request for a state that is already being
+solved waits for that solve instead of starting another one.
+
+    python hint_server.py --socket /tmp/sokoban-hints.sock --workers 4
+    python hint_server.py --port 8765
+
+Set config.HINT_SERVER (game.py) or sokoban_text.HINT_SERVER to the
+socket path or "127.0.0.1:8765" to use it. The protocol is one json
+object per line each way, see hint_client.py:
+
+    {"id": 1, "client": "a", "op": "hint", "rules": "game", "map": "9.txt",
+     "player": [1, 2], "crates": [[3, 2, 0], [5, 2, 1]]}
+    {"id": 1, "status": "ok", "solvable": true, "step": [1, 0], "tile": [2, 2]}
+
+op is "hint", "check" (the same reply, hints are free once the state is
+solved) or "stats". rules "game" reads map from maps/ with the rules of
+game.py, "text" from ../maps/ with the rules of sokoban_text.py. The
+third number of a crate is the pushes it already used. status is "ok",
+"timeout", "dropped" or "error".
+
+Requests are coalesced by the canonical state of hint_cache.HintCache
+(the player tile only counts through the area it can walk in) and the
+plans land in that cache, so following a hint or asking from another
+tile of the same area is answered without solving. A new request of a
+client (the "client" id the caller chose) drops its older one, which is
+answered "dropped", and closing the connection drops all of its
+requests; a solve nobody waits for any more is stopped in its process.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+import bounds
+import config as c
+import controller
+import map_loader
+import telemetry
+from board import BoardState
+from hint_cache import HintCache, first_step
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+import sokoban_text
+
+# rules -> (level loader, map directory, coordinate origin, pushes per box)
+RULES = {
+    "game": (map_loader.load_level_from_file, os.path.join(HERE, "maps"), 0, c.PUSH_LIMIT),
+    "text": (sokoban_text.load_level_from_file, sokoban_text.LEVEL_DIR, 1, sokoban_text.MAX_PUSHES_PER_BOX),
+}
+
+# seconds a solve may take before its process is told to stop
+SERVER_TIMEOUT = 60
+# controller.Session objects a worker process keeps, one per map
+WORKER_SESSIONS = 8
+
+# set in every worker process by init_worker
+flags = None
+sessions = OrderedDict()
+
+
+def drop(table, key, value):
+    """Remove key unless it was taken over by a newer value"""
+    if table.get(key) is value:
+        del table[key]
+
+
+class SharedFlag:
+    """Stop event of a solve in a worker process, set by the server through shared memory"""
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return flags[self.slot] != 0
+
+
+def init_worker(shared, threads):
+    global flags
+    flags = shared
+    # the workers together use the cores, and never ask a server themselves
+    c.SOLVER_THREADS = threads
+    c.HINT_SERVER = None
+    sokoban_text.HINT_SERVER = None
+
+def plan_job(rules, name, player_pos, crates, slot):
+    """
+    Runs in a worker process: ("ok", step directions or None without a
+    plan), ("stopped", None) or ("error", message), and the telemetry
+    record of the solve, which the server writes to its log.
+    """
+    stop = SharedFlag(slot)
+    load, directory, _, limit = RULES[rules]
+    if rules == "game":
+        encoding = controller.encoding_name(c.HINT_BACKEND)
+    else:
+        encoding = sokoban_text.encoding_name(sokoban_text.HINT_BACKEND)
+    with telemetry.call("server", f"{rules}:{name}", encoding, telemetry.state_key(player_pos, crates), log=False) as record:
+        try:
+            if rules == "game":
+                session = sessions.get(name)
+                if session is None:
+                    session = controller.Session(load(os.path.join(directory, name)))
+                    sessions[name] = session
+                    while len(sessions) > WORKER_SESSIONS:
+                        sessions.popitem(last=False)
+                sessions.move_to_end(name)
+                steps = session.plan(player_pos, crates, stop=stop, metrics=record)
+            else:
+                level = load(os.path.join(directory, name))
+                positions = {f"b{n}": pos for n, pos in enumerate(crates, start=1)}
+                pushes_left = {f"b{n}": limit - used for n, used in enumerate(crates.values(), start=1)}
+                names = sokoban_text.ask_plan(level, player_pos, positions, pushes_left, stop=stop, metrics=record)
+                steps = None if names is None else [sokoban_text.DIRS[d] for d in names]
+        except Exception as e:
+            record["outcome"] = f"error: {e}"
+            return "error", str(e), record
+        record.setdefault("outcome", telemetry.outcome(steps, stop))
+    if stop.is_set():
+        return "stopped", None, record
+    return "ok", steps, record
+
+
+class HintServer:
+    """
+    Answers the requests of every connection. All state lives on the
+    event loop thread, only plan_job runs in the process pool.
+    """
+    def __init__(self, workers=None, timeout=SERVER_TIMEOUT, cache_size=c.HINT_CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        # one stop flag per running solve, there are never more than workers
+        self.flags = multiprocessing.RawArray("b", self.workers)
+        self.free = list(range(self.workers))
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=init_worker, initargs=(self.flags, batch.thread_split(self.workers))
+        )
+        self.limit = None
+        self.cache = HintCache(cache_size)
+        # canonical states without a plan, same keys as the cache
+        self.unsolvable = OrderedDict()
+        self.capacity = cache_size
+        self.levels = {}
+        # canonical state -> [solve task, requests waiting for it]
+        self.inflight = {}
+        # client -> task of its newest request
+        self.clients = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "solves": 0, "dropped": 0, "timeouts": 0}
+
+    def level(self, rules, name):
+        if os.path.basename(name) != name:
+            raise ValueError(f"bad map id {name!r}")
+        key = (rules, name)
+        if key not in self.levels:
+            load, directory = RULES[rules][:2]
+            self.levels[key] = load(os.path.join(directory, name))
+        return self.levels[key]
+
+    async def answer(self, request):
+        op = request.get("op", "hint")
+        if op == "stats":
+            return dict(self.stats, status="ok", inflight=len(self.inflight), cached=len(self.cache.entries))
+        if op not in ("hint", "check"):
+            raise ValueError(f"unknown op {op!r}")
+        rules = request.get("rules", "game")
+        if rules not in RULES:
+            raise ValueError(f"unknown rules {rules!r}")
+        name = request["map"]
+        level = self.level(rules, name)
+        _, _, origin, limit = RULES[rules]
+        player_pos = tuple(request["player"])
+        crates = {(x, y): used for x, y, used in request["crates"]}
+
+        level_id = f"{rules}:{name}"
+        state = BoardState.from_level(level, crates, player_pos, origin=origin)
+        key = self.cache.key(level_id, state)
+        pushes = self.cache.get(level_id, state)
+        if pushes is not None or key in self.unsolvable:
+            self.stats["cache_hits"] += 1
+        elif bounds.lower_bound(level, player_pos, crates, limit) is None:
+            self.forget(key)
+        else:
+            status, steps = await self.solve(key, rules, name, player_pos, crates)
+            if status == "stopped":
+                return {"status": "timeout"}
+            if status != "ok":
+                return {"status": "error", "error": steps}
+            if steps is None:
+                self.forget(key)
+            else:
+                pushes = self.cache.put(level_id, state, steps)
+
+        reply = {"status": "ok", "solvable": pushes is not None}
+        if op == "hint":
+            step = first_step(state, pushes) if pushes is not None else None
+            reply["step"] = list(step) if step is not None else None
+            reply["tile"] = [player_pos[0] + step[0], player_pos[1] + step[1]] if step is not None else None
+        return reply
+
+    def forget(self, key):
+        """Remember a state without a plan"""
+        self.unsolvable[key] = True
+        self.unsolvable.move_to_end(key)
+        while len(self.unsolvable) > self.capacity:
+            self.unsolvable.popitem(last=False)
+
+    async def solve(self, key, *job):
+        """Wait for the solve of this state, started here unless one is in flight"""
+        entry = self.inflight.get(key)
+        if entry is None:
+            entry = [asyncio.ensure_future(self.run(*job)), 0]
+            self.inflight[key] = entry
+            entry[0].add_done_callback(lambda _: drop(self.inflight, key, entry))
+        else:
+            self.stats["coalesced"] += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+                drop(self.inflight, key, entry)
+
+    async def run(self, *job):
+        """plan_job on the pool, the slot and the pool place stay taken until the process is done"""
+        await self.limit.acquire()
+        slot = self.free.pop()
+        self.flags[slot] = 0
+        self.stats["solves"] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, plan_job, *job, slot)
+        timer = loop.call_later(self.timeout, self.flags.__setitem__, slot, 1)
+
+        def release(_):
+            timer.cancel()
+            self.free.append(slot)
+            self.limit.release()
+
+        future.add_done_callback(release)
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.flags[slot] = 1
+            raise
+        status, value, record = result
+        telemetry.emit(record)
+        if status == "stopped":
+            self.stats["timeouts"] += 1
+        return status, value
+
+    async def reply(self, request, writer):
+        try:
+            message = await self.answer(request)
+        except asyncio.CancelledError:
+            message = {"status": "dropped"}
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            message = {"status": "error", "error": str(e)}
+        self.send(request, writer, message)
+
+    def send(self, request, writer, message):
+        if message["status"] == "dropped":
+            self.stats["dropped"] += 1
+        message["id"] = request.get("id")
+        if not writer.is_closing():
+            writer.write(json.dumps(message).encode() + b"\n")
+
+    def replied(self, task, request, writer):
+        """A request cancelled before it started never runs reply, it is answered here"""
+        if task.cancelled():
+            self.send(request, writer, {"status": "dropped"})
+
+    async def serve_client(self, reader, writer):
+        """One connection, its requests are answered concurrently"""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    writer.write(b'{"status": "error", "error": "not json"}\n')
+                    continue
+                self.stats["requests"] += 1
+                task = asyncio.ensure_future(self.reply(request, writer))
+                task.add_done_callback(lambda t, request=request: self.replied(t, request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                client = request.get("client")
+                if client is not None:
+                    old = self.clients.get(client)
+                    if old is not None and not old.done():
+                        old.cancel()
+                    self.clients[client] = task
+                    task.add_done_callback(lambda t, client=client: drop(self.clients, client, t))
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, path=None, port=None, host="127.0.0.1"):
+        self.limit = asyncio.Semaphore(self.workers)
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.serve_client, path)
+        else:
+            server = await asyncio.start_server(self.serve_client, host, port)
+        print(f"hint server on {path or f'{host}:{port}'} with {self.workers} workers", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="path of the unix socket")
+    where.add_argument("--port", type=int, help="localhost tcp port")
+    parser.add_argument("--workers", type=int, help="solver processes, default one per core")
+    parser.add_argument("--timeout", type=float, default=SERVER_TIMEOUT, help="seconds per solve")
+    parser.add_argument("--cache-size", type=int, default=c.HINT_CACHE_SIZE, help="states kept by the plan cache")
+    args = parser.parse_args(argv)
+
+    server = HintServer(args.workers, args.timeout, args.cache_size)
+    try:
+        asyncio.run(server.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
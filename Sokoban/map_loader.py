@@ -1,4 +1,6 @@
-import os
+import collection
+import config as c
+import deadlock
 
 def load_level_from_file(path):
     """
@@ -12,11 +14,13 @@ def load_level_from_file(path):
     + = player on goal
     space = empty floor
     lines starting with 'Title' are ignored.
-
+    path may also name one level of a collection, see collection.py.
     """
-    with open(path, "r") as f:
-        raw_lines = [line.rstrip("\n") for line in f]
+    raw_lines, name = collection.read_level(path)
+    return parse_level(raw_lines, name)
 
+def parse_level(raw_lines, name):
+    """The level of load_level_from_file from the lines of its board"""
     #drop empty lines and "title: " lines
 
     lines = [ 
@@ -25,7 +29,7 @@ def load_level_from_file(path):
     ]
 
     if not lines:
-        raise ValueError(f"Level file {path} is empty or invalid.")
+        raise ValueError(f"Level {name} is empty or invalid.")
 
     height = len(lines)
     width = max(len(line) for line in lines)
@@ -55,10 +59,10 @@ def load_level_from_file(path):
                 goals.add((x, y))
 
     if player is None:
-        raise ValueError(f"No player found in level file {path}")
+        raise ValueError(f"No player found in level {name}")
 
     level = {
-        "name"   : os.path.basename(path),
+        "name"   : name,
         "width"  : width,
         "height" : height,
         "walls"  : walls,
@@ -68,7 +72,14 @@ def load_level_from_file(path):
     }
     return level
 
-def build_asp_facts(level, player_pos, boxes):
+def build_static_facts(level, crate_count):
+    """
+    facts that stay the same for a whole level: the coordinate domain,
+    walls, goals and the player/crate names. the changing positions are
+    added by build_asp_facts or set as externals by controller.Session.
+    actions are only grounded on the floor the player can reach and
+    for the pushes that are possible on the static map.
+    """
     w = level["width"]
     h = level["height"]
     walls = level["walls"]
@@ -82,14 +93,39 @@ def build_asp_facts(level, player_pos, boxes):
     for (gx, gy) in sorted(goals):
         lines.append(f"isgoal({gx}, {gy}).")
 
-    px, py = player_pos
+    floor = deadlock.floor_cells(level)
+    dead = deadlock.dead_squares(level)
+    for (fx, fy) in sorted(floor):
+        lines.append(f"floor({fx}, {fy}).")
+
+    for (dx, dy) in sorted(dead):
+        lines.append(f"dead({dx}, {dy}).")
+
+    for (px, py, d) in sorted(deadlock.push_squares(level, floor, dead)):
+        lines.append(f"pushable({px}, {py}, {d}).")
+
+    lines.extend(deadlock.goal_dist_facts(level, floor))
+
     lines.append(f"player(p).")
+    for i in range(1, crate_count + 1):
+        lines.append(f"crate(b{i}).")
+
+    return "\n".join(lines)
+
+def build_asp_facts(level, player_pos, boxes, limit=c.PUSH_LIMIT):
+    """
+    boxes maps every crate tile to its pushes used, limit is the pushes a
+    crate may make in total (config.PUSH_LIMIT)
+    """
+    lines = [build_static_facts(level, len(boxes))]
+
+    px, py = player_pos
     lines.append(f"on({px}, {py}, p ,0).")
-    print(boxes)
     for i, ((bx, by),count) in enumerate(boxes.items(), start = 1):
-        lines.append(f"crate(b{i}).")
         lines.append(f"on({bx}, {by}, b{i}, 0).")
-        for a in range(0,count):
-            lines.append(f"push(b{i},{a}).")
+        lines.append(f"pushes_used(b{i}, {count}).")
+
+    names = {f"b{i}": pos for i, pos in enumerate(boxes, start = 1)}
+    lines.extend(deadlock.target_dist_facts(level, names, limit))
 
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
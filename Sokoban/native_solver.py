@@ -0,0 +1,285 @@
+import heapq
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import bounds
+import config as c
+import deadlock
+from board import BoardState
+
+DIRECTIONS = deadlock.DIRECTIONS
+DIRECTION_NAMES = {(0, -1): "up", (0, 1): "down", (-1, 0): "left", (1, 0): "right"}
+DIRECTION_OFFSETS = {name: d for d, name in DIRECTION_NAMES.items()}
+
+# expanded states before the search gives up
+MAX_NODES = 200000
+
+
+class Cancelled(Exception):
+    """Search stopped by the caller's stop event (or a lost race)"""
+
+
+class GaveUp(Exception):
+    """MAX_NODES states expanded without an answer, there may still be a plan"""
+
+
+def walk(start, state, floor):
+    """Breadth first walk of the player, returns every reached tile with its parent"""
+    offsets = (-state.stride, state.stride, -1, 1)
+    parent = {start: None}
+    todo = deque([start])
+    while todo:
+        i = todo.popleft()
+        for d in offsets:
+            nxt = i + d
+            if nxt not in parent and nxt in floor and not state.has_box(nxt):
+                parent[nxt] = i
+                todo.append(nxt)
+    return parent
+
+def path_to(parent, target):
+    """Tile offsets of the steps from the walk start to target"""
+    steps = []
+    while parent[target] is not None:
+        prev = parent[target]
+        steps.append(target - prev)
+        target = prev
+    steps.reverse()
+    return steps
+
+
+class StateKey:
+    """
+    Transposition table key of a state: hashed by its Zobrist hash, equal
+    only when the normalised player, the boxes and their pushes are, so
+    two states with the same hash never take each other's entry.
+    """
+    __slots__ = ("hash", "player", "boxes", "pushes")
+
+    def __init__(self, h, player, boxes, pushes):
+        self.hash = h
+        self.player = player
+        self.boxes = boxes
+        self.pushes = pushes
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return (
+            self.hash == other.hash and self.player == other.player
+            and self.boxes == other.boxes and self.pushes == other.pushes
+        )
+
+
+class Solver:
+    """
+    A* over box pushes on BoardState nodes. The player position of a state
+    is normalised to the smallest tile it can walk to, states are stored in
+    a transposition table under their Zobrist hash (StateKey) and the lower
+    bound is the cheapest matching of boxes to goals by push distance.
+    """
+    def __init__(self, level, limit):
+        self.limit = limit
+        # states expanded by the last solve
+        self.expanded = 0
+        self.template = BoardState.from_level(level, boxes=())
+        index = self.template.index
+
+        floor = deadlock.floor_cells(level)
+        self.floor = {index(pos) for pos in floor}
+        self.goals = sorted(index(g) for g in level["goals"])
+        self.goal_dist = [
+            {index(pos): d for pos, d in deadlock.pull_distances(level, [g], floor).items()}
+            for g in sorted(level["goals"], key=index)
+        ]
+        self.dist = {index(pos): d for pos, d in deadlock.pull_distances(level, level["goals"], floor).items()}
+        self.directions = {self.template.offset(dx, dy): (dx, dy) for dx, dy in DIRECTIONS}
+
+        rng = random.Random(0)
+        self.player_keys = {i: rng.getrandbits(64) for i in self.floor}
+        self.box_keys = {
+            (i, used): rng.getrandbits(64)
+            for i in self.floor for used in range(limit + 1)
+        }
+
+    def state(self, player_pos, boxes):
+        """BoardState for a dict of box tile to pushes left"""
+        used = {pos: self.limit - left for pos, left in boxes.items()}
+        state = self.template.copy()
+        state.boxes = 0
+        for pos, n in used.items():
+            i = state.index(pos)
+            state.boxes |= 1 << i
+            state.pushes[i] = n
+        state.player = state.index(player_pos)
+        return state
+
+    def key(self, state):
+        player = min(walk(state.player, state, self.floor))
+        h = self.player_keys[player]
+        cells = state.box_cells()
+        for i in cells:
+            h ^= self.box_keys[(i, state.pushes[i])]
+        return StateKey(h, player, state.boxes, bytes(state.pushes[i] for i in cells))
+
+    def lower_bound(self, state):
+        """Cheapest box to goal matching (bounds.min_cost_matching), None if some box can not be placed"""
+        cost = []
+        for i in state.box_cells():
+            left = self.limit - state.pushes[i]
+            row = []
+            for dist in self.goal_dist:
+                d = dist.get(i)
+                row.append(bounds.INFEASIBLE if d is None or d > left else d)
+            if min(row) == bounds.INFEASIBLE:
+                return None
+            cost.append(row)
+        total = bounds.min_cost_matching(cost) if cost else 0
+        return None if total >= bounds.INFEASIBLE else total
+
+    def pushes(self, state, reach):
+        """Every push the player can reach: (player tile, box tile, offset)"""
+        for box in state.box_cells():
+            left = self.limit - state.pushes[box]
+            if left <= 0:
+                continue
+            for d in self.directions:
+                stand = box - d
+                target = box + d
+                if stand not in reach or state.has_box(target):
+                    continue
+                dist = self.dist.get(target)
+                if dist is None or dist > left - 1:
+                    continue
+                yield stand, box, d
+
+    def solve(self, state, stop=None, max_nodes=MAX_NODES):
+        """
+        Returns the step directions of a plan with the fewest pushes,
+        None if there is none. Raises Cancelled when stopped and GaveUp
+        after max_nodes expanded states.
+        """
+        if state.box_count() != len(self.goals):
+            return None
+        h = self.lower_bound(state)
+        if h is None:
+            return None
+
+        start = self.key(state)
+        best_g = {start: 0}
+        came_from = {start: None}
+        counter = 0
+        queue = [(h, 0, counter, start, state)]
+        self.expanded = 0
+
+        while queue:
+            _, g, _, key, state = heapq.heappop(queue)
+            if g > best_g[key]:
+                continue
+            if state.completed():
+                return self.expand(key, came_from)
+
+            self.expanded += 1
+            if stop is not None and stop.is_set():
+                raise Cancelled()
+            if self.expanded > max_nodes:
+                raise GaveUp(f"gave up after {max_nodes} states")
+
+            reach = walk(state.player, state, self.floor)
+            for stand, box, d in self.pushes(state, reach):
+                child = state.copy()
+                child.push(box, d)
+                child_key = self.key(child)
+                if best_g.get(child_key, g + 2) <= g + 1:
+                    continue
+                h = self.lower_bound(child)
+                if h is None:
+                    continue
+                best_g[child_key] = g + 1
+                came_from[child_key] = (key, state, stand, d)
+                counter += 1
+                heapq.heappush(queue, (g + 1 + h, g + 1, counter, child_key, child))
+        return None
+
+    def expand(self, key, came_from):
+        """Turn the chain of pushes into single player steps"""
+        steps = []
+        while came_from[key] is not None:
+            key, state, stand, d = came_from[key]
+            steps = path_to(walk(state.player, state, self.floor), stand) + [d] + steps
+        return [self.directions[d] for d in steps]
+
+
+def plan(level, player_pos, boxes, limit, stop=None):
+    """boxes maps every box tile to its pushes left"""
+    solver = Solver(level, limit)
+    return solver.solve(solver.state(player_pos, boxes), stop)
+
+def crate_plan(level, player_pos, crates, stop=None):
+    """
+    Plan for the crates dict of game.py, None if there is none or the
+    search was stopped. GaveUp passes through to the caller.
+    """
+    boxes = {pos: c.PUSH_LIMIT - used for pos, used in crates.items()}
+    try:
+        return plan(level, player_pos, boxes, c.PUSH_LIMIT, stop)
+    except Cancelled:
+        return None
+
+def hint(level, player_pos, crates, stop=None):
+    """Same answer as controller.Session.hint: the tile to step on next"""
+    steps = crate_plan(level, player_pos, crates, stop)
+    if not steps:
+        return None
+    dx, dy = steps[0]
+    return player_pos[0] + dx, player_pos[1] + dy
+
+def ask_plan(level, player_pos, box_positions_by_id, pushes_left_by_id, limit, stop=None):
+    """Same answer as sokoban_text.ask_plan: all move directions by name, may raise GaveUp"""
+    boxes = {pos: pushes_left_by_id.get(bid, limit) for bid, pos in box_positions_by_id.items()}
+    try:
+        steps = plan(level, player_pos, boxes, limit, stop)
+    except Cancelled:
+        return None
+    if steps is None:
+        return None
+    return [DIRECTION_NAMES[step] for step in steps]
+
+class EitherEvent:
+    """is_set() as soon as one of the wrapped events is set"""
+    def __init__(self, *events):
+        self.events = [e for e in events if e is not None]
+
+    def is_set(self):
+        return any(e.is_set() for e in self.events)
+
+
+def race(*jobs, stop=None):
+    """
+    Run every job on its own thread and return the first answer that is
+    not None. Jobs get an event that is set once the race is decided (or
+    the caller's stop is set) so the others can stop early, a job that
+    raises drops out. When every job raised the first error is raised.
+    """
+    decided = threading.Event()
+    either = EitherEvent(decided, stop)
+    pool = ThreadPoolExecutor(len(jobs))
+    pending = {pool.submit(job, either) for job in jobs}
+    errors = []
+    try:
+        while pending and not (stop is not None and stop.is_set()):
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                elif future.result() is not None:
+                    return future.result()
+        if errors and len(errors) == len(jobs):
+            raise errors[0]
+        return None
+    finally:
+        decided.set()
+        pool.shutdown(wait=False)
@@ -0,0 +1,69 @@
+"""
+clingo search configurations for controller.Session. No configuration
+is the fastest on every level, so there are two ways to pick one:
+
+- the profile of a level: benchmark.py --tune solves the start of every
+  map with every configuration and saves the fastest one as
+  config.PROFILE_DIR/<map>.json. Every Session of that map uses it from
+  then on, also the ones of hint_server.py.
+- the "portfolio" hint backend (config.HINT_BACKEND) races one single
+  threaded Session per configuration of config.PORTFOLIO and takes the
+  first answer, for levels without a profile.
+"""
+import json
+import os
+
+import config as c
+
+# name -> clingo options on top of the ones of controller.Session
+CONFIGURATIONS = {
+    "default": [],
+    "frumpy": ["--configuration=frumpy"],
+    "jumpy": ["--configuration=jumpy"],
+    "tweety": ["--configuration=tweety"],
+    "crafty": ["--configuration=crafty"],
+    "trendy": ["--configuration=trendy"],
+    "handy": ["--configuration=handy"],
+    "usc": ["--opt-strategy=usc"],
+}
+
+
+def profile_path(name):
+    return os.path.join(c.PROFILE_DIR, name + ".json")
+
+def load_profile(name):
+    """The tuned profile of a level, None without one"""
+    if c.PROFILE_DIR is None:
+        return None
+    try:
+        with open(profile_path(name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_profile(name, configuration, times):
+    """
+    times maps every configuration tried to its seconds, None when it gave
+    up. False when config.PROFILE_DIR is None and nothing was saved.
+    """
+    if c.PROFILE_DIR is None:
+        return False
+    os.makedirs(c.PROFILE_DIR, exist_ok=True)
+    profile = {"configuration": configuration, "args": CONFIGURATIONS[configuration], "times": times}
+    with open(profile_path(name), "w") as f:
+        json.dump(profile, f, indent=1)
+        f.write("\n")
+    return True
+
+def choose(name, configuration=None):
+    """
+    (configuration, clingo options) for a Session of the level: the given
+    configuration, else the one of its profile, else "default". The
+    options of a profile are the ones saved with it.
+    """
+    if configuration is None:
+        profile = load_profile(name)
+        if profile is not None:
+            return profile["configuration"], profile["args"]
+        configuration = "default"
+    return configuration, CONFIGURATIONS[configuration]
@@ -0,0 +1,166 @@
+import pygame
+import config as c
+
+GOAL_FRAME_COLOR = (0, 255, 0)
+HINT_COLOR = (255, 105, 180)
+BADGE_RADIUS = 12
+# offset of the push counter badge from the top right corner of its tile
+BADGE_OFFSET = 15
+TELEMETRY_COLOR = (170, 170, 170)
+TELEMETRY_FONT_SIZE = 18
+
+
+class Renderer:
+    """
+    Draws game.py with as little work per frame as possible. Floor, walls
+    and goals are drawn once per level into a background surface. Every
+    frame the content of each tile (crate and its pushes, broken crate,
+    hint, player) is compared with the last frame. Only tiles that
+    changed are drawn again from the background and sent to the display
+    with display.update(rects), and a frame where nothing changed costs
+    nothing. Push counter badges, overlay texts and the dimmed overlay
+    are rendered once and reused. With config.TELEMETRY_OVERLAY the top
+    bar has a second line for the newest solver call (telemetry.py).
+    """
+    def __init__(self, screen, images, font):
+        self.screen = screen
+        self.images = images
+        self.font = font
+        self.small = pygame.font.SysFont(None, TELEMETRY_FONT_SIZE)
+        self.badges = {}
+        self.labels = {}
+        self.dim = pygame.Surface((c.SCREEN_WIDTH, c.SCREEN_HEIGHT))
+        self.dim.set_alpha(160)
+        self.dim.fill((0, 0, 0))
+        self.background = None
+        self.goals = set()
+        self.tiles = {}
+        self.top = None
+        self.overlays = []
+
+    def set_level(self, walls, goals):
+        """Draw the static part of a new level, the next frame is drawn in full"""
+        self.goals = set(goals)
+        self.background = pygame.Surface((c.SCREEN_WIDTH, c.SCREEN_HEIGHT)).convert()
+        self.background.fill(c.BG_COLOR)
+        for x in range(c.GRID_WIDTH):
+            for y in range(c.GRID_HEIGHT):
+                self.background.blit(self.images["floor"], self.tile_rect((x, y)))
+        for pos in walls:
+            self.background.blit(self.images["wall"], self.tile_rect(pos))
+        for pos in goals:
+            self.background.blit(self.images["goal"], self.tile_rect(pos))
+        self.tiles = {}
+        self.top = None
+
+    def tile_rect(self, pos):
+        x, y = pos
+        return pygame.Rect(x * c.TILE_SIZE, y * c.TILE_SIZE + c.BOARD_TOP, c.TILE_SIZE, c.TILE_SIZE)
+
+    def badge(self, remaining):
+        """Push counter circle with its number, rendered once per count"""
+        surface = self.badges.get(remaining)
+        if surface is None:
+            if remaining == 1:
+                color = (255, 0, 0)
+            elif remaining <= 3:
+                color = (255, 255, 0)
+            else:
+                color = (0, 255, 0)
+            size = 2 * BADGE_RADIUS + 1
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            center = (BADGE_RADIUS, BADGE_RADIUS)
+            pygame.draw.circle(surface, color, center, BADGE_RADIUS)
+            pygame.draw.circle(surface, (0, 0, 0), center, BADGE_RADIUS, 2)
+            text = self.font.render(str(remaining), True, (0, 0, 0))
+            surface.blit(text, text.get_rect(center=center))
+            self.badges[remaining] = surface
+        return surface
+
+    def label(self, text):
+        surface = self.labels.get(text)
+        if surface is None:
+            surface = self.labels[text] = self.font.render(text, True, (255, 255, 255))
+        return surface
+
+    def contents(self, player, crates, destroyed, hints):
+        """tile -> (pushes used of its crate or None, broken crate, hint, player)"""
+        tiles = {}
+        for pos, used in crates.items():
+            tiles[pos] = [used, False, False, False]
+        for pos in destroyed:
+            tiles.setdefault(pos, [None, False, False, False])[1] = True
+        for pos in hints:
+            tiles.setdefault(pos, [None, False, False, False])[2] = True
+        tiles.setdefault(player, [None, False, False, False])[3] = True
+        return {pos: tuple(content) for pos, content in tiles.items()}
+
+    def draw_tile(self, pos, content):
+        rect = self.tile_rect(pos)
+        self.screen.blit(self.background, rect, rect)
+        if content is None:
+            return rect
+        used, broken, hint, player = content
+        if used is not None:
+            self.screen.blit(self.images["crate"], rect)
+            if pos in self.goals:
+                pygame.draw.rect(self.screen, GOAL_FRAME_COLOR, rect, 3)
+            badge = self.badge(c.MAX_PUSHES - used)
+            self.screen.blit(badge, badge.get_rect(center=(rect.right - BADGE_OFFSET, rect.top + BADGE_OFFSET)))
+        if broken:
+            self.screen.blit(self.images["broken_crate"], rect)
+        if hint:
+            pygame.draw.circle(self.screen, HINT_COLOR, rect.center, c.GOAL_RADIUS)
+        if player:
+            self.screen.blit(self.images["player"], rect)
+        return rect
+
+    def draw_top_bar(self, move_count, banner_text, buttons, status=None):
+        """Draw menu bar and buttons, and the telemetry line under them"""
+        rect = pygame.Rect(0, 0, c.SCREEN_WIDTH, c.BOARD_TOP)
+        pygame.draw.rect(self.screen, c.TOP_BAR_COLOR, rect)
+        if status is not None:
+            line = self.small.render(status, True, TELEMETRY_COLOR)
+            self.screen.blit(line, (10, c.TOP_BAR_HEIGHT + (c.TELEMETRY_LINE_HEIGHT - line.get_height()) // 2))
+        for b in buttons:
+            b.draw()
+        moves_text = self.font.render(f"Moves: {move_count}", True, c.TEXT_COLOR)
+        self.screen.blit(moves_text, (c.SCREEN_WIDTH - 250, (c.TOP_BAR_HEIGHT - moves_text.get_height()) // 2))
+        label = self.font.render(banner_text, True, c.TEXT_COLOR)
+        self.screen.blit(
+            label,
+            (c.SCREEN_WIDTH - label.get_width() - 10, (c.TOP_BAR_HEIGHT - label.get_height()) // 2)
+        )
+        return rect
+
+    def draw_overlay(self, text):
+        """Draw won/game over screen"""
+        self.screen.blit(self.dim, (0, 0))
+        label = self.label(text)
+        self.screen.blit(label, label.get_rect(center=(c.SCREEN_WIDTH // 2, c.SCREEN_HEIGHT // 2)))
+
+    def draw(self, player, crates, destroyed, hints, move_count, banner_text, buttons, overlays, status=None):
+        """Bring the display up to date with this frame, status is the telemetry line"""
+        tiles = self.contents(player, crates, destroyed, hints)
+        top = (move_count, banner_text, tuple(b.hover for b in buttons), status)
+        dirty = [pos for pos in tiles.keys() | self.tiles.keys() if tiles.get(pos) != self.tiles.get(pos)]
+        full = self.top is None or overlays != self.overlays or (overlays and (dirty or top != self.top))
+
+        if full:
+            self.screen.blit(self.background, (0, 0))
+            for pos, content in tiles.items():
+                self.draw_tile(pos, content)
+            self.draw_top_bar(move_count, banner_text, buttons, status)
+            for text in overlays:
+                self.draw_overlay(text)
+            pygame.display.flip()
+        else:
+            rects = [self.draw_tile(pos, tiles.get(pos)) for pos in dirty]
+            if top != self.top:
+                rects.append(self.draw_top_bar(move_count, banner_text, buttons, status))
+            if rects:
+                pygame.display.update(rects)
+
+        self.tiles = tiles
+        self.top = top
+        self.overlays = list(overlays)
@@ -0,0 +1,125 @@
+"""
+One record per solver call, to find the levels and states that make the
+solvers blow up. controller.Session.hint/solvable/hint_anytime,
+controller.solve, sokoban_text.ask_hint/ask_hint_anytime and the solves
+of hint_server.py each open a record with call() and hand it down to
+controller.solve_horizon/solve_anytime as their metrics dict, which add
+the numbers of every clingo solve call with count():
+
+    {"time": 1760781234.5, "op": "hint", "map": "9.txt", "state": "3f2a9c01d4e7",
+     "encoding": "sokoban.lp", "ground": 0.0412, "solve": 0.3105, "solves": 7,
+     "atoms": 10234, "rules": 18872, "conflicts": 512, "models": 1,
+     "horizon": 23, "outcome": "solved", "wall": 0.3593}
+
+ground and solve are seconds, atoms and rules the size of the ground
+program, conflicts and models summed over the solve calls. outcome is
+"solved", "unsolvable", "stopped", "cached", "server", "bound" (ruled out
+by bounds.lower_bound), "optimal", "cut off" (anytime hints) or
+"error: ...". With config.TELEMETRY_LOG the records are appended to that
+file as json lines, rotated at TELEMETRY_LOG_BYTES. The game.py overlay
+(config.TELEMETRY_OVERLAY) shows the newest record while it grows.
+"""
+import hashlib
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from contextlib import contextmanager
+
+import config as c
+
+logger = logging.getLogger("sokoban.telemetry")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+# path of the handler that writes the log, see emit
+log_path = None
+lock = threading.Lock()
+
+# record of the newest call, finished or not, for the game.py overlay
+latest = None
+
+
+def state_key(player_pos, crates):
+    """Short stable hash of a state, crates maps a tile to the pushes its crate used"""
+    state = [list(player_pos), sorted([x, y, used] for (x, y), used in crates.items())]
+    return hashlib.sha1(json.dumps(state).encode()).hexdigest()[:12]
+
+def count(metrics, ctl):
+    """Add the last solve call of ctl to metrics (a dict or None)"""
+    if metrics is None:
+        return
+    stats = ctl.statistics
+    metrics["solves"] = metrics.get("solves", 0) + 1
+    metrics["conflicts"] = metrics.get("conflicts", 0) + int(stats["solving"]["solvers"]["conflicts"])
+    metrics["models"] = metrics.get("models", 0) + int(stats["summary"]["models"]["enumerated"])
+    metrics["atoms"] = int(stats["problem"]["lp"]["atoms"])
+    metrics["rules"] = int(stats["problem"]["lp"]["rules"])
+
+def outcome(result, stop=None):
+    if stop is not None and stop.is_set():
+        return "stopped"
+    return "unsolvable" if result is None else "solved"
+
+@contextmanager
+def call(op, name, encoding, state=None, log=True):
+    """
+    The record of one solver call, the caller sets its outcome. It is
+    emitted when the block ends, also when it raises.
+    """
+    global latest
+    record = {"time": round(time.time(), 3), "op": op, "map": name, "state": state, "encoding": encoding}
+    latest = record
+    began = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["outcome"] = f"error: {e}"
+        raise
+    finally:
+        record["wall"] = time.perf_counter() - began
+        if log:
+            emit(record)
+
+def handler():
+    """The rotating handler for config.TELEMETRY_LOG, replaced when the setting changes"""
+    global log_path
+    with lock:
+        if log_path != c.TELEMETRY_LOG:
+            for old in logger.handlers[:]:
+                logger.removeHandler(old)
+                old.close()
+            new = logging.handlers.RotatingFileHandler(
+                c.TELEMETRY_LOG, maxBytes=c.TELEMETRY_LOG_BYTES, backupCount=c.TELEMETRY_LOG_BACKUPS
+            )
+            new.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(new)
+            log_path = c.TELEMETRY_LOG
+
+def emit(record):
+    """Append a finished record to config.TELEMETRY_LOG, if set"""
+    global latest
+    latest = record
+    if c.TELEMETRY_LOG is None:
+        return
+    handler()
+    for key in ("ground", "solve", "wall"):
+        if key in record:
+            record[key] = round(record[key], 4)
+    logger.info(json.dumps(record))
+
+def summary(record):
+    """One line for the overlay, numbers of a running call are the ones so far"""
+    if record is None:
+        return "no solver call yet"
+    parts = [record["op"], str(record["map"]), record["encoding"], record.get("outcome", "...")]
+    if "wall" in record:
+        parts.append(f"{record['wall']:.2f}s")
+    # the solving thread may be adding to it, so every key is read with get
+    if record.get("solves"):
+        parts.append(f"ground {record.get('ground', 0):.2f}s solve {record.get('solve', 0):.2f}s")
+        parts.append(f"{record.get('atoms')} atoms {record.get('rules')} rules")
+        parts.append(f"{record.get('conflicts')} conflicts")
+    if record.get("horizon") is not None:
+        parts.append(f"t={record['horizon']}")
+    return "  ".join(parts)
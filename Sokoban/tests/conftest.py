@@ -0,0 +1,9 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOKOBAN = os.path.dirname(HERE)
+MAPS = os.path.join(SOKOBAN, "maps")
+
+# the modules of the game import each other as top level modules
+sys.path.insert(0, SOKOBAN)
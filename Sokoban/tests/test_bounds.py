@@ -0,0 +1,30 @@
+import bounds
+import controller
+import config as c
+import map_loader
+import native_solver
+
+# the player has to push the box on the goal below it before it can walk
+BLOCKED = [
+    "######",
+    "#@####",
+    "#*   #",
+    "# $  #",
+    "#.   #",
+    "######",
+]
+
+
+def test_blocked_player_still_has_a_bound(monkeypatch):
+    monkeypatch.setattr(c, "HINT_SERVER", None)
+    monkeypatch.setattr(c, "HINT_CACHE_DIR", None)
+    monkeypatch.setattr(c, "GROUND_CACHE_DIR", None)
+    level = map_loader.parse_level(BLOCKED, "blocked")
+    crates = {pos: 0 for pos in level["boxes"]}
+
+    bound = bounds.lower_bound(level, level["player"], crates, c.PUSH_LIMIT)
+    assert bound is not None
+    plan = native_solver.crate_plan(level, level["player"], crates)
+    assert plan is not None
+    assert bound[1] <= len(plan)
+    assert controller.Session(level, "default").solvable(level["player"], crates)
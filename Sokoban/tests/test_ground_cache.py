@@ -0,0 +1,30 @@
+import os
+
+import config as c
+import controller
+import map_loader
+from conftest import MAPS
+
+
+def plan_lengths(level, states):
+    """Lengths of the shortest plans, the plans themselves may differ"""
+    session = controller.Session(level, "default")
+    return [len(session.plan(player, crates) or []) for player, crates in states]
+
+def test_sessions_share_the_cached_program(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "GROUND_CACHE_HORIZON", 15)
+    monkeypatch.setattr(c, "HINT_SERVER", None)
+    monkeypatch.setattr(c, "HINT_CACHE_DIR", None)
+    level = map_loader.load_level_from_file(os.path.join(MAPS, "9.txt"))
+    crates = {pos: 0 for pos in level["boxes"]}
+    # the second state checks that the first one does not stay switched on
+    states = [(level["player"], crates), ((3, 3), crates)]
+
+    monkeypatch.setattr(c, "GROUND_CACHE_DIR", None)
+    expected = plan_lengths(level, states)
+    assert all(expected)
+
+    monkeypatch.setattr(c, "GROUND_CACHE_DIR", str(tmp_path))
+    assert plan_lengths(level, states) == expected
+    assert plan_lengths(level, states) == expected
+    assert len(list(tmp_path.glob("*.aspif"))) == 1
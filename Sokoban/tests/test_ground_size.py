@@ -0,0 +1,25 @@
+import json
+import os
+
+import pytest
+
+import benchmark
+
+with open(benchmark.GROUND_BASELINE, "r") as f:
+    BASELINE = json.load(f)
+
+
+def test_every_map_has_a_baseline():
+    for path in benchmark.map_files():
+        if os.path.basename(path) in benchmark.GROUND_SKIP:
+            continue
+        for encoding in benchmark.ENCODINGS:
+            assert f"{benchmark.map_name(path)} {encoding}" in BASELINE
+
+@pytest.mark.parametrize("name", sorted(BASELINE))
+def test_ground_size_did_not_grow(name):
+    """Update with benchmark.py --ground-baseline ground_baseline.json --update-baseline"""
+    path, encoding = name.rsplit(" ", 1)
+    size = benchmark.ground_size(os.path.join(benchmark.ROOT, path), encoding)
+    old = BASELINE[name]
+    assert size["atoms"] <= old["atoms"] and size["rules"] <= old["rules"], f"{name}: {old} -> {size}"
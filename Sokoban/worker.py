@@ -0,0 +1,54 @@
+import threading
+
+
+class SolverWorker:
+    """
+    Runs the hint/check solves of the game on a background thread so the
+    pygame loop keeps drawing. Only the newest job counts: submitting a
+    new one or calling cancel() sets the stop event of the one in flight
+    and its answer is thrown away.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.stop = None
+        self.done = None
+
+    def submit(self, kind, job):
+        """Start job(stop) on a new thread, its answer comes back through poll()"""
+        with self.lock:
+            self.cancel_locked()
+            self.stop = threading.Event()
+            args = (self.generation, kind, job, self.stop)
+        threading.Thread(target=self.run, args=args, daemon=True).start()
+
+    def run(self, generation, kind, job, stop):
+        try:
+            value = job(stop)
+        except Exception as e:
+            kind, value = "failed", str(e)
+        with self.lock:
+            if generation == self.generation and not stop.is_set():
+                self.done = (kind, value)
+                self.stop = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancel_locked()
+
+    def cancel_locked(self):
+        if self.stop is not None:
+            self.stop.set()
+            self.stop = None
+        self.generation += 1
+        self.done = None
+
+    def busy(self):
+        """A job is still thinking about the current state"""
+        return self.stop is not None
+
+    def poll(self):
+        """(kind, answer) of a finished job once, else None"""
+        with self.lock:
+            done, self.done = self.done, None
+        return done
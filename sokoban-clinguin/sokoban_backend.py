@@ -0,0 +1,168 @@
+"""
+clinguin backend for the Sokoban UI (Sokoban/UI.lp).
+
+    clinguin client-server --custom-classes sokoban_backend.py \\
+        --backend SokobanBackend --map ../Sokoban/maps/8.txt
+
+The standard ClingoBackend grounds the UI program again for every click
+and solves it over the whole domain state. Here the moves are played by
+engine.Engine (the rules of game.py). The level is grounded once, with
+state.lp and the player/box tiles as externals, and the UI program is
+only grounded for the first answer and after a restart. After that, a
+move switches the externals of the tiles it changed and solves the
+ground program. Only those tiles get new image attributes in the cached
+answer. The clinguin client still receives the whole UI json, which it
+always expects, but building it no longer grows with the map.
+"""
+import os
+import sys
+
+from clingo import Function, Number, String, parse_term
+from clinguin.server.application.attribute import AttributeDto
+from clinguin.server.application.backends import ClingoBackend
+from clinguin.utils import image_to_b64
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOKOBAN = os.path.join(os.path.dirname(HERE), "Sokoban")
+sys.path.insert(0, SOKOBAN)
+
+import config as c
+import map_loader
+from engine import MOVES, Engine
+
+STATE_FILE = os.path.join(HERE, "state.lp")
+UI_FILE = os.path.join(SOKOBAN, "UI.lp")
+DEFAULT_MAP = os.path.join(SOKOBAN, "maps", "9.txt")
+
+# asset name -> image, in the order the images of a tile are listed
+ASSETS = {
+    "floor": os.path.join(SOKOBAN, "elements", "floor.png"),
+    "goal": os.path.join(SOKOBAN, "elements", "goal.png"),
+    "block": os.path.join(SOKOBAN, "elements", "block.png"),
+    "crate": os.path.join(SOKOBAN, "elements", "crate.png"),
+    "player": os.path.join(SOKOBAN, "elements", "player.png"),
+}
+TITLE = "Sokoban"
+
+
+class SokobanBackend(ClingoBackend):
+    """ClingoBackend that keeps the level grounded and only updates the tiles a move changed"""
+
+    @classmethod
+    def register_options(cls, parser):
+        ClingoBackend.register_options(parser)
+        parser.add_argument("--map", help="level file or collection level (maps/8.txt, pack.xsb#3)", metavar="")
+
+    def _init_command_line(self):
+        if not self._args.ui_files:
+            self._args.ui_files = [UI_FILE]
+        if STATE_FILE not in (self._args.domain_files or []):
+            self._args.domain_files = [STATE_FILE] + (self._args.domain_files or [])
+        super()._init_command_line()
+        self._level = map_loader.load_level_from_file(self._args.map or DEFAULT_MAP)
+
+    def _load_and_add(self):
+        super()._load_and_add()
+        # no crate names: the boxes of state.lp are all crate b
+        self._ctl.add("base", [], map_loader.build_static_facts(self._level, 0))
+        self._ctl.add("base", [], "\n".join(f'asset({name}, "{path}").' for name, path in ASSETS.items()))
+
+    def _restart(self):
+        super()._restart()
+        self._engine = Engine(self._level, c.MAX_PUSHES, destroy=True)
+        # the answer of get() and the parts of it a move changes
+        self._answer = None
+        self._tiles = {}
+        self._title = None
+        self._images = {}
+        self._dirty = set()
+        self._state = self._positions()
+        for pos, who in self._state:
+            self._set_external(self._on(pos, who), "true")
+
+    def _on(self, pos, who):
+        x, y = pos
+        return Function("on", [Number(x), Number(y), Function(who), Number(0)])
+
+    def _positions(self):
+        """(tile, "p" or "b") of the player and every box"""
+        return {(self._engine.player, "p")} | {(pos, "b") for pos in self._engine.crates()}
+
+    def _image(self, path):
+        """Attribute value of an image, read and encoded once"""
+        if path not in self._images:
+            with open(path, "rb") as f:
+                self._images[path] = str(String(image_to_b64(f.read())))
+        return self._images[path]
+
+    def _index(self, element):
+        """Find the tile canvases and the title in the answer"""
+        symbol = parse_term(element.id)
+        if symbol.match("tile", 2):
+            self._tiles[(symbol.arguments[0].number, symbol.arguments[1].number)] = element
+        elif element.id == "title":
+            self._title = element
+        for child in element.children:
+            self._index(child)
+
+    def _sprites(self, tiles):
+        """tile -> images of that tile, from one solve of the ground program"""
+        sprites = {}
+
+        def on_model(model):
+            for x, y in tiles:
+                sprites[(x, y)] = [
+                    path for path in ASSETS.values()
+                    if model.contains(Function("sprite", [Number(x), Number(y), String(path)]))
+                ]
+
+        self._ctl.solve(on_model=on_model)
+        return sprites
+
+    def _patch(self):
+        """Bring the cached answer up to date with the tiles changed since the last one"""
+        for pos, images in self._sprites(self._dirty).items():
+            element = self._tiles.get(pos)
+            if element is None:
+                continue
+            element.attributes = [a for a in element.attributes if a.key != "image"] + [
+                AttributeDto(element.id, "image", self._image(path)) for path in images
+            ]
+        self._dirty = set()
+
+        if self._title is not None:
+            label = TITLE
+            if self._engine.completed():
+                label = f"{TITLE} - solved in {self._engine.moves} moves"
+            elif self._engine.lost:
+                label = f"{TITLE} - {self._engine.reason}"
+            for a in self._title.attributes:
+                if a.key == "label":
+                    a.value = str(String(label))
+
+    def get(self):
+        if self._answer is None:
+            self._answer = super().get()
+            self._index(self._answer["ui"])
+        if self._dirty:
+            self._patch()
+        return self._answer
+
+    def move(self, direction):
+        """
+        Operation of the arrow buttons, when(btn_up, click, call, move(up)):
+        plays the move and switches the externals of the tiles it changed.
+        """
+        direction = str(direction)
+        if direction not in MOVES:
+            raise ValueError(f"unknown direction {direction}")
+        if self._engine.apply(direction) is None:
+            return
+        state = self._positions()
+        for pos, who in self._state - state:
+            self._set_external(self._on(pos, who), "false")
+        for pos, who in state - self._state:
+            self._set_external(self._on(pos, who), "true")
+        self._dirty.update(pos for pos, _ in self._state ^ state)
+        self._state = state
+        self._outdate()
@@ -5,33 +5,79 @@
 
 import subprocess
 import tempfile
+import threading
+import time
 import os
 import sys
 from collections import Counter
 
+try:
+    import clingo
+except ImportError:
+    # without the python module hints go through the clingo executable
+    clingo = None
+
 
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 BASE_LP_FILE = os.path.join(ROOT, "sokoban_base.lp")
 LEVEL_DIR = os.path.join(ROOT, "maps")
 
+# level analysis shared with the pygame version
+sys.path.insert(0, os.path.join(ROOT, "Sokoban"))
+import bounds
+import collection
+import config as c
+import controller
+import hint_client
+import deadlock
+import map_loader
+import native_solver
+import telemetry
+from board import BoardState
+from engine import Engine
+from hint_cache import HintCache, first_step
+
 
 MAX_PUSHES_PER_BOX = 5
 
+# seconds before a clingo hint gives up
+HINT_TIMEOUT = 60
+
+# hint solver: "clingo", "push" (Sokoban/sokoban_push.lp), "native"
+# (Sokoban/native_solver.py) or "race" for clingo and native at once
+HINT_BACKEND = "clingo"
+
+# unix socket or "127.0.0.1:port" of Sokoban/hint_server.py, None = solve here
+HINT_SERVER = None
+# the text game runs one level at a time, a newer hint drops the older one
+HINT_CLIENT = hint_client.new_client()
+
+DIRS = {
+    "up": (0, -1),
+    "down": (0, 1),
+    "left": (-1, 0),
+    "right": (1, 0),
+}
+
 
 def list_level_files(level_dir: str):
     if not os.path.isdir(level_dir):
         raise FileNotFoundError(f"Missing levels folder: {level_dir}")
-    files = [os.path.join(level_dir, f) for f in os.listdir (level_dir) if f.endswith(".txt")]
+    # a collection file (.xsb/.sok) holds many levels, see Sokoban/collection.py
+    files = [os.path.join(level_dir, f) for f in os.listdir (level_dir)
+             if f.endswith(".txt") or collection.is_collection(f)]
     files.sort()
 
     if not files:
-        raise FileNotFoundError(f"No .txt levels found in: {level_dir}")
+        raise FileNotFoundError(f"No .txt or collection levels found in: {level_dir}")
     return files
 
 
 LEVEL_FILES = list_level_files(LEVEL_DIR)
 
+hint_cache = HintCache()
+
 
 def load_level_from_file(path):
     """
@@ -55,15 +101,14 @@ def load_level_from_file(path):
 
     lines starting with 'Title' are ignored.
     Empty lines are ignored.
+    path may also name one level of a collection ("pack.xsb#12").
     """
- 
-   
-
-    with open(path, "r", encoding= "utf-8") as f:
-        raw_lines = [line.rstrip("\n") for line in f]
-
+    raw_lines, name = collection.read_level(path)
+    return parse_level(raw_lines, name)
 
 
+def parse_level(raw_lines, name):
+    """the level of load_level_from_file from the lines of its board"""
     lines = [ 
 
         line for line in raw_lines
@@ -72,7 +117,7 @@ def load_level_from_file(path):
     ]
 
     if not lines:
-        raise ValueError(f"Level file {path} is empty or invalid.")
+        raise ValueError(f"Level {name} is empty or invalid.")
 
     height = len(lines)
     width = max(len(line) for line in lines)
@@ -104,11 +149,11 @@ def load_level_from_file(path):
             
 
     if player is None:
-        raise ValueError(f"No player '@' found in level file {path}")
+        raise ValueError(f"No player '@' found in level {name}")
 
     return  {
 
-        "name"   : os.path.basename(path),
+        "name"   : name,
         "width"  : width,
         "height" : height,
         "walls"  : walls,
@@ -135,53 +180,291 @@ def build_asp_facts(level, player_pos, box_positions_by_id, pushes_left_by_id):
     for (gx, gy) in sorted(level["goals"]):
         lines.append(f"goal({gx}, {gy}).")
 
+    for (dx, dy) in sorted(deadlock.dead_squares(level)):
+        lines.append(f"dead({dx}, {dy}).")
+
+    # search guidance for the #heuristic statements
+    lines.extend(deadlock.goal_dist_facts(level))
+    lines.extend(deadlock.target_dist_facts(level, box_positions_by_id, MAX_PUSHES_PER_BOX))
+
     px, py = player_pos
     lines.append(f"player({px}, {py}, 0).")
 
     for bid in sorted(box_positions_by_id.keys()):
         bx, by = box_positions_by_id[bid]
         lines.append(f"box({bid}, {bx}, {by}, 0).")
-        n = pushes_left_by_id.get(bid, MAX_PUSHES_PER_BOX)
-        lines.append(f"push_left({bid}, {n}, 0).")
+        n = MAX_PUSHES_PER_BOX - pushes_left_by_id.get(bid, MAX_PUSHES_PER_BOX)
+        lines.append(f"pushes_used({bid}, {n}).")
 
     return "\n".join(lines)
 
-def ask_hint(level, player_pos, box_positions_by_id, pushes_left_by_id):
+def pushes_used(box_positions_by_id, pushes_left_by_id):
+    """box tile -> pushes already used, in box id order"""
+    return {box_positions_by_id[bid]: MAX_PUSHES_PER_BOX - pushes_left_by_id.get(bid, MAX_PUSHES_PER_BOX)
+            for bid in sorted(box_positions_by_id)}
+
+def ask_hint(level, player_pos, box_positions_by_id, pushes_left_by_id, backend = None):
     """
          return: 
         - direction string ('up', 'down', 'left', 'right') or
-        - None if unsatisfiable or error.
+        - None if unsatisfiable.
+        raises HintError when the solver fails.
+
+    plans are kept in hint_cache, so following the hints only
+    asks the solver once. with HINT_SERVER the server is asked first.
     """
+    used = pushes_used(box_positions_by_id, pushes_left_by_id)
+    backend = backend or HINT_BACKEND
+    with telemetry.call("hint", level["name"], encoding_name(backend), telemetry.state_key(player_pos, used)) as record:
+        if HINT_SERVER is not None:
+            try:
+                reply = hint_client.request(
+                    HINT_SERVER, hint_client.state_message("hint", "text", level["name"], player_pos, used),
+                    timeout = HINT_TIMEOUT, client = HINT_CLIENT)
+                if reply["status"] == "ok":
+                    record["outcome"] = "server"
+                    return native_solver.DIRECTION_NAMES[tuple(reply["step"])] if reply["step"] else None
+            except hint_client.ServerError as e:
+                print(e)
+
+        state = BoardState.from_level(level, used, player_pos, origin = 1)
+
+        pushes = hint_cache.get(level["name"], state)
+        if pushes is None:
+            plan = ask_plan(level, player_pos, box_positions_by_id, pushes_left_by_id, backend, metrics = record)
+            record.setdefault("outcome", telemetry.outcome(plan))
+            if plan is None:
+                return None
+            pushes = hint_cache.put(level["name"], state, [DIRS[d] for d in plan])
+        else:
+            record["outcome"] = "cached"
+
+    step = first_step(state, pushes)
+    if step is None:
+        return None
+    return native_solver.DIRECTION_NAMES[step]
 
+def ask_hint_anytime(level, player_pos, box_positions_by_id, pushes_left_by_id, budget = None):
+    """
+    return (direction, proven) within budget seconds (config.HINT_BUDGET):
+    the first move of the best plan found and whether that plan is proven
+    optimal. The horizon starts at the lower bound and doubles up to
+    config.ANYTIME_HORIZON while there is no plan, without a plan in time
+    direction is None and not proven. Without a budget anytime hints are
+    off and the shortest plan of ask_hint is waited for, as in game.py.
+    raises HintError when the solver fails.
+    """
+    budget = budget or c.HINT_BUDGET
+    if budget is None:
+        return ask_hint(level, player_pos, box_positions_by_id, pushes_left_by_id), True
+    if clingo is None:
+        raise HintError("anytime hints need the clingo module")
+    if not os.path.exists(BASE_LP_FILE):
+        raise HintError(f"Missing encoding: {BASE_LP_FILE}")
+
+    used = pushes_used(box_positions_by_id, pushes_left_by_id)
+    with telemetry.call("anytime", level["name"], encoding_name("clingo"), telemetry.state_key(player_pos, used)) as record:
+        state = BoardState.from_level(level, used, player_pos, origin = 1)
+        pushes = hint_cache.get(level["name"], state)
+        if pushes is not None:
+            record["outcome"] = "cached"
+            step = first_step(state, pushes)
+            return (native_solver.DIRECTION_NAMES[step] if step is not None else None), True
+
+        bound = bounds.lower_bound(level, player_pos, used, MAX_PUSHES_PER_BOX)
+        if bound is None:
+            record["outcome"] = "bound"
+            return None, True
+
+        model, proven = None, False
+        if bound[1] <= c.ANYTIME_HORIZON:
+            asp_facts = build_asp_facts(level, player_pos, box_positions_by_id, pushes_left_by_id)
+            try:
+                # grounding counts against the budget too
+                deadline = time.perf_counter() + budget
+                ctl = clingo.Control(["--opt-mode=opt"] + controller.HEURISTIC_ARGS)
+                ctl.load(BASE_LP_FILE)
+                ctl.add("base", [], asp_facts)
+                ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+                horizon, grounded = max(bound[1], 1), 0
+                while time.perf_counter() < deadline:
+                    model, proven, grounded = controller.solve_anytime(
+                        ctl, grounded, horizon, deadline - time.perf_counter(), metrics = record)
+                    record["horizon"] = horizon
+                    # the shorter horizons had no plan, so the best one up to this one is optimal
+                    if model is not None or not proven or horizon >= c.ANYTIME_HORIZON:
+                        break
+                    horizon = min(2 * horizon, c.ANYTIME_HORIZON)
+            except RuntimeError as e:
+                raise HintError(f"clingo failed: {e}") from e
+        if model is None:
+            record["outcome"] = "unsolvable" if proven else "cut off"
+        else:
+            record["outcome"] = "optimal" if proven else "cut off"
+
+    if model is None:
+        # no plan up to ANYTIME_HORIZON does not rule out a longer one
+        return None, False
+    moves = sorted((s for s in model if s.match("move", 2)), key = lambda s: s.arguments[1].number)
+    plan = [s.arguments[0].name for s in moves]
+    if proven:
+        hint_cache.put(level["name"], state, [DIRS[d] for d in plan])
+    return (plan[0] if plan else None), proven
+
+class HintError(Exception):
+    """the solver could not answer (missing encoding, clingo error or timeout)"""
+
+
+def encoding_name(backend):
+    """what a hint backend solves with, for the telemetry records"""
+    names = {"clingo": os.path.basename(BASE_LP_FILE), "push": os.path.basename(controller.PUSH_ENCODING)}
+    return names.get(backend, backend)
+
+def ask_plan(level, player_pos, box_positions_by_id, pushes_left_by_id, backend = None, stop = None, metrics = None):
+    """
+    all directions of a plan in order, None if unsatisfiable or the stop
+    event was set. raises HintError when the solver fails or gives up. metrics gets
+    the statistics of the clingo solves (see Sokoban/telemetry.py).
+    """
+    backend = backend or HINT_BACKEND
+    try:
+        if backend == "native":
+            return native_solver.ask_plan(level, player_pos, box_positions_by_id, pushes_left_by_id, MAX_PUSHES_PER_BOX, stop)
+        if backend == "race":
+            return native_solver.race(
+                lambda stop: ask_plan_clingo(level, player_pos, box_positions_by_id, pushes_left_by_id, stop, metrics),
+                lambda stop: native_solver.ask_plan(level, player_pos, box_positions_by_id, pushes_left_by_id, MAX_PUSHES_PER_BOX, stop),
+                stop = stop,
+            )
+    except native_solver.GaveUp as e:
+        # out of nodes is not unsatisfiable
+        raise HintError(str(e)) from e
+    if backend == "push":
+        return ask_plan_push(level, player_pos, box_positions_by_id, pushes_left_by_id, stop, metrics)
+    return ask_plan_clingo(level, player_pos, box_positions_by_id, pushes_left_by_id, stop, metrics)
+
+def ask_plan_clingo(level, player_pos, box_positions_by_id, pushes_left_by_id, stop = None, metrics = None):
     if not os.path.exists(BASE_LP_FILE):
+        raise HintError(f"Missing encoding: {BASE_LP_FILE}")
+
+    # impossible states are answered without grounding anything
+    bound = bounds.lower_bound(level, player_pos, pushes_used(box_positions_by_id, pushes_left_by_id), MAX_PUSHES_PER_BOX)
+    if bound is None:
+        if metrics is not None:
+            metrics["outcome"] = "bound"
         return None
-    
+
     asp_facts = build_asp_facts(level, player_pos, box_positions_by_id, pushes_left_by_id)
-    
+    max_horizon = controller.horizon_limit(level, len(box_positions_by_id))
+
+    if clingo is None:
+        return ask_plan_subprocess(asp_facts, max_horizon)
+    return ask_plan_in_process(asp_facts, max_horizon, stop, bound[1], metrics)
+
+def ask_plan_in_process(asp_facts, max_horizon, stop = None, start = 0, metrics = None):
+    """
+    solve with the clingo module: the facts are added with Control.add
+    and the plan is read from the move/2 symbols of the best model.
+    the horizon grows from start, a lower bound on the plan length.
+    """
+    timeout = threading.Event()
+    stop = native_solver.EitherEvent(stop, timeout)
+    timer = threading.Timer(HINT_TIMEOUT, timeout.set)
+    model = []
+
+    def on_model(m):
+        model[:] = m.symbols(shown = True)
+
+    try:
+        began = time.perf_counter()
+        ctl = clingo.Control(["--opt-mode=opt"] + controller.HEURISTIC_ARGS)
+        ctl.load(BASE_LP_FILE)
+        ctl.add("base", [], asp_facts)
+        ctl.ground([("base", []), ("check", [clingo.Number(0)])])
+        if metrics is not None:
+            metrics["ground"] = metrics.get("ground", 0) + time.perf_counter() - began
+        timer.start()
+        horizon, _ = controller.solve_horizon(ctl, 0, max_horizon, on_model, stop, metrics, start = start)
+        if metrics is not None:
+            metrics["horizon"] = horizon
+    except RuntimeError as e:
+        raise HintError(f"clingo failed: {e}") from e
+    finally:
+        timer.cancel()
+
+    if timeout.is_set():
+        raise HintError(f"no answer within {HINT_TIMEOUT} s")
+    if horizon is None:
+        return None
+
+    moves = sorted((s for s in model if s.match("move", 2)), key = lambda s: s.arguments[1].number)
+    return [s.arguments[0].name for s in moves]
+
+def ask_plan_push(level, player_pos, box_positions_by_id, pushes_left_by_id, stop = None, metrics = None):
+    """
+    solve with Sokoban/sokoban_push.lp, one time step per push, and
+    expand the pushes into single moves.
+    """
+    if clingo is None:
+        raise HintError("the push encoding needs the clingo module")
+
+    crates = pushes_used(box_positions_by_id, pushes_left_by_id)
+    bound = bounds.lower_bound(level, player_pos, crates, MAX_PUSHES_PER_BOX)
+    if bound is None:
+        return None
+    asp_facts = map_loader.build_asp_facts(level, player_pos, crates, MAX_PUSHES_PER_BOX)
+
+    timeout = threading.Event()
+    stop = native_solver.EitherEvent(stop, timeout)
+    timer = threading.Timer(HINT_TIMEOUT, timeout.set)
+    try:
+        timer.start()
+        symbols = controller.solve_pushes(asp_facts, len(crates), MAX_PUSHES_PER_BOX, stop = stop, start = bound[0], metrics = metrics)
+    except RuntimeError as e:
+        raise HintError(f"clingo failed: {e}") from e
+    finally:
+        timer.cancel()
+
+    if timeout.is_set():
+        raise HintError(f"no answer within {HINT_TIMEOUT} s")
+    if symbols is None:
+        return None
+
+    state = BoardState.from_level(level, crates, player_pos, origin = 1)
+    steps = controller.push_steps(state, list(crates), symbols)
+    if steps is None:
+        return None
+    return [native_solver.DIRECTION_NAMES[step] for step in steps]
+
+def ask_plan_subprocess(asp_facts, max_horizon):
+    """fallback through the clingo executable and its text output."""
     with tempfile.NamedTemporaryFile(mode = "w", suffix = ".lp", delete = False, encoding= "utf-8") as tmp:
         tmp.write(asp_facts)
         tmp_path = tmp.name
 
     try:
-        cmd = ["clingo", BASE_LP_FILE, tmp_path, "--quiet=1", "--opt-mode=optN", "-n", "1"]
-        result = subprocess.run(cmd, capture_output = True, text = True, timeout = 60 )
+        cmd = ["clingo", BASE_LP_FILE, tmp_path, "--quiet=1", "--opt-mode=optN", "-n", "1", "-c", f"imax={max_horizon}"] + controller.HEURISTIC_ARGS
+        result = subprocess.run(cmd, capture_output = True, text = True, timeout = HINT_TIMEOUT)
         output = (result.stdout or "") + "\n" + (result.stderr or "")
 
         if "UNSATISFIABLE" in output:
             return None
+        if "SATISFIABLE" not in output and "OPTIMUM FOUND" not in output:
+            raise HintError(f"clingo failed: {result.stderr.strip()}")
         
+        moves = {}
         tokens = output.split()
         for t in tokens:
             if t.startswith("move(") and t.endswith(")"): 
                 inside = t[t.find ("(") + 1 : t.find(")")]
                 d, tt = [s.strip() for s in inside.split(",")]
-                if tt == "0":
-                    return  d
-        
+                moves[int(tt)] = d
 
-        return None
-    except Exception:
-        return None
+        return [moves[tt] for tt in sorted(moves)]
+    except FileNotFoundError as e:
+        raise HintError("clingo executable not found") from e
+    except subprocess.TimeoutExpired as e:
+        raise HintError(f"no answer within {HINT_TIMEOUT} s") from e
     finally:
         try:
             os.remove(tmp_path)
@@ -189,113 +472,100 @@ def ask_hint(level, player_pos, box_positions_by_id, pushes_left_by_id):
             pass
 
 
-
-
-
-
-
-
-
 class SokobanTextGame:
     def __init__(self):
-        self.levels = [load_level_from_file(f) for f in LEVEL_FILES]
-        self.level_index = 0
-        self.player = self.level["player"]
+        # levels are parsed when they are played, a collection may hold thousands
+        self.levels = collection.Levels(LEVEL_FILES, load_level_from_file)
+        self.load_level(0)
 
     def load_level(self, idx):
         self.level_index = idx
         self.level = self.levels[idx]
-        self.player = self.level["player"]
+        # the same rules as the pygame version, a box without pushes left can not move
+        self.engine = Engine(self.level, MAX_PUSHES_PER_BOX, origin = 1)
 
+        self.game_over = False
+        self.message = f"Loaded {self.level['name']}"
 
+    @property
+    def board(self):
+        return self.engine.board
 
-        self.box_ids = [f"b{i}" for i in range(1, len(self.level["boxes"]) + 1)]
-        self.box_pos = {bid: pos for bid, pos in zip(self.box_ids, self.level["boxes"])}
-        self.push_left ={bid: MAX_PUSHES_PER_BOX for bid in self.box_ids}
+    @property
+    def player(self):
+        return self.board.pos(self.board.player)
 
+    @property
+    def box_pos(self):
+        """box ids b1..bn in tile order, as used by build_asp_facts"""
+        return {f"b{n}": self.board.pos(i) for n, i in enumerate(self.board.box_cells(), start = 1)}
 
-        self.game_over = False
-        self.message = f"Loaded {self.level['name']}"
+    @property
+    def push_left(self):
+        return {f"b{n}": MAX_PUSHES_PER_BOX - self.board.pushes[i] for n, i in enumerate(self.board.box_cells(), start = 1)}
 
     def in_bounds(self, pos):
         x, y = pos
-        return 1 <= self.level["width"] and 1 <= y <= self.level["height"]
+        return 1 <= x <= self.level["width"] and 1 <= y <= self.level["height"]
     
     def is_wall(self, pos):
         return pos in self.level["walls"] 
 
     def box_id_at(self, pos):
-        for bid, p in self.box_pos.items():
-            if p == pos:
-                return bid
-            return None 
+        i = self.board.index(pos)
+        if not self.in_bounds(pos) or not self.board.has_box(i):
+            return None
+        return f"b{self.board.box_rank(i) + 1}"
 
 
     def is_solved(self):
-        return all(self.box_pos[bid] in self.level["goals"] for bid in self.box_pos)
+        return self.board.completed()
 
 
     def check_game_over(self):
-        for bid, pos in self.box_pos.items():
-            if self.push_left[bid] <= 0 and pos not in self.level["goals"]:
+        for i in self.board.box_cells():
+            if self.board.pushes[i] >= MAX_PUSHES_PER_BOX and not self.board.is_goal(i):
                 self.game_over = True
                 self.message = "NO SOLUTION: a box used all 5 pushes without reaching a goal."
                 return True
-            return False
+        if self.engine.lost:
+            self.game_over = True
+            self.message = f"NO SOLUTION: {self.engine.reason}."
+            return True
+        return False
 
     def legal_move(self):
-        dirs = {
-            "up": (0, -1),
-            "down": (0, 1),
-            "left": (-1, 0),
-            "right": (1, 0),
-        }
-        px, py = self.player
-        boxes = set(self.box_pos.values())
-
-        legal = []
-        for name, (dx, dy) in dirs.items():
-            nx, ny = px + dx, py + dy
-            npos = (nx, ny)
-
-            if not self.in_bounds(npos) or self.is_wall(npos):
-                continue
-
-            if npos not in boxes:
-                legal.append(name)
-                continue
-
-
-            bid = self.box_id_at(npos)
-            if bid is None:
-                continue
-
-            # push limit rule
-            if self.push_left[bid] <= 0 and self.box_pos[bid] not in self.level["goals"]:
-                continue
-
-            bpos = (nx + dx, ny, dy)
-            if (not self.in_bounds(bpos)) or self.is_wall(bpos) or (bpos in boxes):
-                continue
-
-            legal.append(name)
-
-        return legal
+        return [name for name, (dx, dy) in DIRS.items() if self.engine.can_step(dx, dy)]
     
 
     def move(self, dx, dy):
-        
-
-
+        if self.game_over:
+            return False
 
+        if self.engine.step(dx, dy) is None:
+            self.message = "Blocked."
+            return False
 
+        if self.is_solved():
+            self.message = "SOLVED!"
+        else:
+            self.message = ""
+            self.check_game_over()
+        return True
 
+    def undo(self):
+        if not self.engine.undo():
+            return False
+        self.game_over = False
+        self.message = ""
+        self.check_game_over()
+        return True
 
 
 if __name__ == "main":
     try:
-        levels = [load_level_from_file(f) for f in LEVEL_FILES]
-        print("Found levels:", [lv1["name"] for lv1 in levels])
+        levels = collection.Levels(LEVEL_FILES, load_level_from_file)
+        print("Found levels:", len(levels))
 
         
     except Exception as e: